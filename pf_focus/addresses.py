@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+import bisect
+import ipaddress
+
+
+PORT_ALIAS_TYPES = ('port', 'url_ports', 'urltable_ports')
+# Aliases whose members are downloaded by the firewall and not part of the backup
+URL_ALIAS_TYPES = ('url', 'url_ports', 'urltable', 'urltable_ports')
+
+def parse_networks(address):
+    """Networks of an address, CIDR or address range like 10.0.0.1-10.0.0.9, None if it is none of these"""
+    try:
+        return (ipaddress.ip_network(address, strict=False),)
+    except ValueError:
+        pass
+    first, separator, last = address.partition('-')
+    if separator:
+        try:
+            return tuple(ipaddress.summarize_address_range(ipaddress.ip_address(first), ipaddress.ip_address(last)))
+        except (ValueError, TypeError):
+            pass
+    return None
+
+def parse_port_range(port):
+    """A (low, high) port range of a port or range like 1000:2000 or 1000-2000, None if it is none of these"""
+    low, _, high = port.replace(':', '-').partition('-')
+    if not low.isdigit() or not (high or low).isdigit():
+        return None
+    return int(low), int(high or low)
+
+def collapse_networks(networks):
+    collapsed = []
+    for version in (4, 6):
+        collapsed.extend(ipaddress.collapse_addresses(network for network in networks if network.version == version))
+    return tuple(collapsed)
+
+def merge_ranges(ranges):
+    merged = []
+    for low, high in sorted(ranges):
+        if merged and low <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], high))
+        else:
+            merged.append((low, high))
+    return tuple(merged)
+
+class AddressSet(object):
+    """Collapsed networks, plus the names that cannot be resolved to networks like hostnames or URLs"""
+    __slots__ = ('networks', 'names')
+
+    def __init__(self, networks=(), names=()):
+        self.networks = collapse_networks(networks)
+        self.names = tuple(sorted(set(names)))
+
+    def __eq__(self, other):
+        return isinstance(other, AddressSet) and self.networks == other.networks and self.names == other.names
+
+    def __hash__(self):
+        return hash((self.networks, self.names))
+
+    def __repr__(self):
+        return 'AddressSet({!r}, {!r})'.format(self.networks, self.names)
+
+    @property
+    def resolved(self):
+        return not self.names
+
+    def covers(self, other):
+        """Whether every address of other is in this set, unresolved names only cover themselves"""
+        if not set(other.names).issubset(self.names):
+            return False
+        return all(any(network.version == outer.version and network.subnet_of(outer) for outer in self.networks) for network in other.networks)
+
+    def get_data(self, cache=True):
+        data = {'networks': [str(network) for network in self.networks]}
+        if self.names:
+            data['unresolved'] = list(self.names)
+        return data
+
+class PortSet(object):
+    """Merged (low, high) port ranges, plus the names that cannot be resolved to ports"""
+    __slots__ = ('ranges', 'names')
+
+    def __init__(self, ranges=(), names=()):
+        self.ranges = merge_ranges(ranges)
+        self.names = tuple(sorted(set(names)))
+
+    def __eq__(self, other):
+        return isinstance(other, PortSet) and self.ranges == other.ranges and self.names == other.names
+
+    def __hash__(self):
+        return hash((self.ranges, self.names))
+
+    def __repr__(self):
+        return 'PortSet({!r}, {!r})'.format(self.ranges, self.names)
+
+    @property
+    def resolved(self):
+        return not self.names
+
+    def covers(self, other):
+        if not set(other.names).issubset(self.names):
+            return False
+        for low, high in other.ranges:
+            # Ranges are merged, so only the last one starting at or below low can contain the range
+            i = bisect.bisect_right(self.ranges, (low, float('inf'))) - 1
+            if i < 0 or self.ranges[i][1] < high:
+                return False
+        return True
+
+    def get_data(self, cache=True):
+        data = {'ports': [str(low) if low == high else '{}-{}'.format(low, high) for low, high in self.ranges]}
+        if self.names:
+            data['unresolved'] = list(self.names)
+        return data
+
+def resolve_aliases(aliases):
+    """AddressSet or PortSet per alias name, given (type, members) per alias name
+
+    Nested aliases are expanded. An alias that refers back to itself, directly or
+    through others, keeps the name of the alias closing the cycle as unresolved.
+    URL aliases and aliases without members are left out, their members are not
+    known from the backup.
+    """
+    resolved = {}
+
+    def resolve(name, stack):
+        if name in resolved:
+            return resolved[name]
+        alias_type, members = aliases[name]
+        if alias_type in URL_ALIAS_TYPES or not members:
+            resolved[name] = None
+            return None
+        stack.append(name)
+        values, names = [], []
+        parse_member = parse_port_range if alias_type in PORT_ALIAS_TYPES else parse_networks
+        for member in members:
+            if member in aliases:
+                # Cycles and aliases of the other kind stay unresolved
+                nested = None if member in stack else resolve(member, stack)
+                if not nested is None and isinstance(nested, PortSet) == (alias_type in PORT_ALIAS_TYPES):
+                    values.extend(nested.ranges if isinstance(nested, PortSet) else nested.networks)
+                    names.extend(nested.names)
+                else:
+                    names.append(member)
+                continue
+            value = parse_member(member)
+            if value is None:
+                names.append(member)
+            elif alias_type in PORT_ALIAS_TYPES:
+                values.append(value)
+            else:
+                values.extend(value)
+        stack.pop()
+        resolved[name] = PortSet(values, names) if alias_type in PORT_ALIAS_TYPES else AddressSet(values, names)
+        return resolved[name]
+
+    members = dict((name, resolve(name, [])) for name in aliases)
+    return dict((name, value) for name, value in members.items() if not value is None)
+
+def interface_addresses(interface_data, address_only=False):
+    """The network of an interface, or only its address, as an AddressSet"""
+    ipaddr = str(interface_data.get('ipaddr', ''))
+    try:
+        if address_only:
+            return AddressSet((ipaddress.ip_network(ipaddr),))
+        return AddressSet((ipaddress.ip_interface('{}/{}'.format(ipaddr, interface_data.get('subnet', ''))).network,))
+    except ValueError:
+        # e.g. "dhcp" or "pppoe", the address is only known at runtime
+        return AddressSet(names=(interface_data.get('name', ipaddr),))
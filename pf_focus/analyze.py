@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+import argparse
+import bisect
+import json
+import sys
+
+import yaml
+
+from pf_focus.addresses import AddressSet
+from pf_focus.cache import CACHE_DIR_HELP, DEFAULT_CACHE_SIZE, ParseCache
+from pf_focus.markdown import output_markdown_table
+from pf_focus.parse import PARSER_BACKENDS, parse_pfsense, parse_pfsense_cached
+from pf_focus.pfsense import PfSenseDocument
+from pf_focus.util import getattr_r
+from pf_focus.yamldump import YamlDumper
+
+
+# Addresses and ports are None for "any", an AddressSet or a PortSet otherwise
+PORT_PROTOCOLS = ('tcp', 'udp', 'tcp/udp')
+# Rule options that narrow down the matched packets beyond addresses and ports
+RULE_QUALIFIERS = ('tagged', 'os', 'icmptype', 'sched', 'direction')
+
+def node_string(node):
+    return None if node is None else node.string
+
+def location_addresses(location):
+    if location is None:
+        return None
+    addresses = location.addresses
+    if not addresses is None and hasattr(location, 'not'):
+        # A negation only covers the very same negation
+        address = node_string(getattr(location, 'address', None)) or node_string(getattr(location, 'network', None))
+        return AddressSet(names=('!' + address,))
+    return addresses
+
+def rule_qualifier(rule, name):
+    value = node_string(getattr(rule, name, None))
+    if name == 'direction' and value == 'any':
+        # Floating rules match both directions by default
+        return None
+    return value
+
+def is_unknown(values):
+    """Whether an AddressSet or PortSet is empty, which means its members are unknown rather than none"""
+    if values is None:
+        return False
+    return not values.names and not (values.networks if isinstance(values, AddressSet) else values.ranges)
+
+def covers(outer, inner):
+    if outer is None:
+        return True
+    elif inner is None:
+        return False
+    return outer.covers(inner)
+
+class RuleMatch(object):
+    """The packets a filter rule matches, as far as they can be told from the configuration"""
+
+    def __init__(self, position, rule):
+        self.position = position
+        self.rule = rule
+        self.type = node_string(getattr(rule, 'type', None)) or 'pass'
+        self.interface = node_string(getattr(rule, 'interface', None)) or ''
+        # pfSense defaults to IPv4 when no IP version is set
+        self.ipprotocol = node_string(getattr(rule, 'ipprotocol', None)) or 'inet'
+        self.protocol = node_string(getattr(rule, 'protocol', None))
+        if self.protocol == 'any':
+            self.protocol = None
+        source, destination = getattr(rule, 'source', None), getattr(rule, 'destination', None)
+        self.source = location_addresses(source)
+        self.destination = location_addresses(destination)
+        if self.protocol in PORT_PROTOCOLS:
+            self.source_ports = getattr(source, 'ports', None)
+            self.destination_ports = getattr(destination, 'ports', None)
+        else:
+            self.source_ports = self.destination_ports = None
+        self.qualifiers = tuple(rule_qualifier(rule, name) for name in RULE_QUALIFIERS)
+        self.floating = hasattr(rule, 'floating')
+        self.quick = hasattr(rule, 'quick')
+        self.scheduled = not node_string(getattr(rule, 'sched', None)) is None
+
+    @property
+    def final(self):
+        """Whether a packet matched by this rule is not evaluated further, the last match wins for non-quick floating rules"""
+        if self.type == 'match':
+            return False
+        return self.quick or not self.floating
+
+    @property
+    def coverable(self):
+        return not any(map(is_unknown, (self.source, self.destination, self.source_ports, self.destination_ports)))
+
+    @property
+    def can_cover(self):
+        # A scheduled rule only matches part of the time
+        return self.final and not self.scheduled
+
+    def covers(self, other):
+        """Whether every packet matched by other is matched by this rule as well"""
+        if self.ipprotocol != 'inet46' and self.ipprotocol != other.ipprotocol:
+            return False
+        if not self.protocol is None and self.protocol != other.protocol:
+            if self.protocol != 'tcp/udp' or not other.protocol in PORT_PROTOCOLS:
+                return False
+        if any(not qualifier is None and qualifier != other_qualifier for qualifier, other_qualifier in zip(self.qualifiers, other.qualifiers)):
+            return False
+        return covers(self.source, other.source) and covers(self.destination, other.destination) and \
+            covers(self.source_ports, other.source_ports) and covers(self.destination_ports, other.destination_ports)
+
+class PrefixIndex(object):
+    """Rules by the networks of one side, finds the rules with a network containing a given one by its prefixes"""
+
+    def __init__(self):
+        self.rules = []
+        self.any_rules = []
+        self.unresolved = {}
+        self.networks = {}
+        self.prefixlens = {4: [], 6: []}
+
+    def add(self, rule_id, addresses):
+        self.rules.append(rule_id)
+        if addresses is None:
+            self.any_rules.append(rule_id)
+            return
+        for name in addresses.names:
+            self.unresolved.setdefault(name, []).append(rule_id)
+        for network in addresses.networks:
+            key = (network.version, network.prefixlen, int(network.network_address) >> (network.max_prefixlen - network.prefixlen))
+            self.networks.setdefault(key, []).append(rule_id)
+            prefixlens = self.prefixlens[network.version]
+            i = bisect.bisect_left(prefixlens, network.prefixlen)
+            if i == len(prefixlens) or prefixlens[i] != network.prefixlen:
+                prefixlens.insert(i, network.prefixlen)
+
+    def containing(self, network):
+        rule_ids = set()
+        address = int(network.network_address)
+        for prefixlen in self.prefixlens[network.version]:
+            if prefixlen > network.prefixlen:
+                break
+            rule_ids.update(self.networks.get((network.version, prefixlen, address >> (network.max_prefixlen - prefixlen)), ()))
+        return rule_ids
+
+    def candidates(self, addresses):
+        """Rules which may cover the addresses, a superset of the rules which do"""
+        if addresses is None:
+            return set(self.any_rules)
+        if is_unknown(addresses):
+            return set()
+        # A covering rule has all unresolved names and, for each network, a network containing it
+        rule_ids = None
+        for name in addresses.names:
+            rule_ids = set(self.unresolved.get(name, ())) if rule_ids is None else rule_ids.intersection(self.unresolved.get(name, ()))
+        for network in addresses.networks:
+            containing = self.containing(network)
+            rule_ids = containing if rule_ids is None else rule_ids & containing
+        if rule_ids is None:
+            # Nothing is covered by every rule
+            return set(self.rules)
+        return rule_ids.union(self.any_rules)
+
+class ShadowIndex(object):
+    """The rules of one interface in evaluation order, indexed by source and destination networks"""
+
+    def __init__(self):
+        self.matches = []
+        self.sources = PrefixIndex()
+        self.destinations = PrefixIndex()
+
+    def covering(self, match):
+        """The first earlier rule covering match, None if there is none"""
+        candidates = self.destinations.candidates(match.destination)
+        if candidates:
+            candidates &= self.sources.candidates(match.source)
+        for rule_id in sorted(candidates):
+            if self.matches[rule_id].covers(match):
+                return self.matches[rule_id]
+        return None
+
+    def add(self, match):
+        rule_id = len(self.matches)
+        self.matches.append(match)
+        self.sources.add(rule_id, match.source)
+        self.destinations.add(rule_id, match.destination)
+
+def rule_summary(match):
+    return {
+        'position': match.position,
+        'tracker': node_string(getattr(match.rule, 'tracker', None)),
+        'type': match.type,
+        'descr': node_string(getattr(match.rule, 'descr', None)),
+    }
+
+def analyze_rules(doc):
+    """Findings for filter rules never matched because an earlier rule on the same interfaces matches first
+
+    Floating rules are evaluated on their own, before the interface rules.
+    """
+    indexes = {}
+    findings = []
+    for position, rule in enumerate(getattr_r(doc, 'pfsense.filter.rule') or (), 1):
+        if hasattr(rule, 'disabled'):
+            continue
+        match = RuleMatch(position, rule)
+        index = indexes.setdefault((match.floating, match.interface), ShadowIndex())
+        covering = index.covering(match) if match.coverable else None
+        if not covering is None:
+            if match.covers(covering):
+                kind = 'duplicate' if match.type == covering.type else 'shadowed'
+            else:
+                kind = 'redundant' if match.type == covering.type else 'shadowed'
+            finding = {'kind': kind, 'interface': match.interface, 'floating': match.floating}
+            finding['rule'] = rule_summary(match)
+            finding['covered_by'] = rule_summary(covering)
+            findings.append(finding)
+        if match.can_cover:
+            index.add(match)
+    return findings
+
+def output_analysis_yaml(findings, stream):
+    yaml.dump(findings, stream, Dumper=YamlDumper, sort_keys=False)
+
+def output_analysis_json(findings, stream):
+    json.dump(findings, stream, indent=2)
+    stream.write('\n')
+
+def output_analysis_markdown(findings, stream):
+    stream.write("# pfSense filter rule analysis\n")
+    if not findings:
+        stream.write("No shadowed, redundant or duplicate rules.\n")
+        return
+    rows = ((finding['kind'], finding['interface'] + (' (floating)' if finding['floating'] else ''),
+             finding['rule']['position'], finding['rule']['type'], finding['rule']['descr'],
+             finding['covered_by']['position'], finding['covered_by']['type'], finding['covered_by']['descr']) for finding in findings)
+    output_markdown_table(stream, ('Kind', 'Interface', 'Rule', 'Type', 'Description', 'Covered by', 'Type', 'Description'), rows)
+
+ANALYSIS_FORMATS = {
+    'yaml': output_analysis_yaml,
+    'json': output_analysis_json,
+    'md': output_analysis_markdown,
+}
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-i", dest="input_path", help="XML input path", required=True)
+    parser.add_argument("-o", dest="output_path", help="Output path", default="-")
+    parser.add_argument("-f", dest="output_format", help="Output format", default="yaml", choices=ANALYSIS_FORMATS.keys())
+    parser.add_argument("--parser", dest="parser", help="XML parser backend", default="sax", choices=PARSER_BACKENDS.keys())
+    parser.add_argument("--cache-dir", dest="cache_dir", help=CACHE_DIR_HELP)
+    parser.add_argument("--cache-size", dest="cache_size", help="Maximum cache size in MB", type=int, default=DEFAULT_CACHE_SIZE // 2**20)
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    doc = PfSenseDocument()
+    if args.cache_dir:
+        doc, _ = parse_pfsense_cached(args.input_path, doc, ParseCache(args.cache_dir, args.cache_size * 2**20), args.parser)
+    else:
+        parse_pfsense(args.input_path, doc, args.parser)
+
+    findings = analyze_rules(doc)
+    output_func = ANALYSIS_FORMATS[args.output_format]
+    if args.output_path == '-':
+        output_func(findings, sys.stdout)
+    else:
+        with open(args.output_path, 'w+') as output_file:
+            output_func(findings, output_file)
+
+if __name__ == '__main__':
+    main()
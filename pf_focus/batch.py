@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from pf_focus.cache import DEFAULT_CACHE_SIZE, ParseCache
+from pf_focus.formats import OUTPUT_FORMATS, sharing_sections
+from pf_focus.parse import parse_pfsense, parse_pfsense_cached
+from pf_focus.pfsense import PfSenseDocument
+
+
+def batch_input_paths(input_dir):
+    input_names = filter(lambda name: name.lower().endswith('.xml'), os.listdir(input_dir))
+    return sorted(os.path.join(input_dir, input_name) for input_name in input_names)
+
+def batch_output_path(output_dir, input_path, output_format):
+    input_name = os.path.splitext(os.path.basename(input_path))[0]
+    return os.path.join(output_dir, '{}.{}'.format(input_name, output_format))
+
+def batch_file(input_path, output_dir, output_formats, parser='sax', cache_dir=None, cache_size=DEFAULT_CACHE_SIZE):
+    start = time.perf_counter()
+    try:
+        doc = PfSenseDocument()
+        if cache_dir is None:
+            parse_pfsense(input_path, doc, parser)
+        else:
+            doc, _ = parse_pfsense_cached(input_path, doc, ParseCache(cache_dir, cache_size), parser)
+        with sharing_sections(output_formats):
+            for output_format in output_formats:
+                with open(batch_output_path(output_dir, input_path, output_format), 'w+') as output_file:
+                    OUTPUT_FORMATS[output_format](doc, output_file)
+    except Exception as e:
+        return input_path, time.perf_counter() - start, '{}: {}'.format(type(e).__name__, e)
+    return input_path, time.perf_counter() - start, None
+
+def run_batch(input_dir, output_dir, output_formats, parser='sax', jobs=None, cache_dir=None, cache_size=DEFAULT_CACHE_SIZE):
+    os.makedirs(output_dir, exist_ok=True)
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = {}
+        for input_path in batch_input_paths(input_dir):
+            future = executor.submit(batch_file, input_path, output_dir, output_formats, parser, cache_dir, cache_size)
+            futures[future] = input_path
+        for future in as_completed(futures):
+            try:
+                yield future.result()
+            except Exception as e:
+                # The worker process itself failed, e.g. it was killed
+                yield futures[future], None, '{}: {}'.format(type(e).__name__, e)
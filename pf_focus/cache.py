@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+import gc
+import hashlib
+import os
+import pickle
+import stat
+import tempfile
+
+from pf_focus import pfsense
+
+
+# Bump when the pickled layout of nodes changes without a schema change
+CACHE_FORMAT = 2
+CACHE_SUFFIX = '.pickle'
+DEFAULT_CACHE_SIZE = 256 * 2**20
+# Entries are unpickled, which runs code of whoever could write them
+CACHE_DIR_HELP = "Directory for cached parse results, must be owned by you and not writable by others"
+
+def iter_node_classes(klass=pfsense.PfSenseNode):
+    yield klass
+    for subclass in klass.__subclasses__():
+        yield from iter_node_classes(subclass)
+
+def schema_version():
+    digest = hashlib.sha256('{}:{}'.format(CACHE_FORMAT, pickle.HIGHEST_PROTOCOL).encode())
+    for klass in sorted(set(iter_node_classes()), key=lambda klass: (klass.__module__, klass.__qualname__)):
+        schema = sorted((name, child.__qualname__, child_type, attr_name) for name, (child, child_type, attr_name) in klass._schema.items())
+        digest.update(repr((klass.__module__, klass.__qualname__, klass.__dict__.get('__slots__'), klass._wildcards, schema)).encode())
+    return digest.hexdigest()
+
+def check_cache_dir(cache_dir):
+    """Refuses a directory others can write to, loading a planted entry would run their code"""
+    dir_stat = os.stat(cache_dir)
+    # Windows has no uids, and no group or world write bits either
+    if hasattr(os, 'getuid') and dir_stat.st_uid != os.getuid():
+        raise PermissionError("Cache directory {} is not owned by the current user".format(cache_dir))
+    if dir_stat.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+        raise PermissionError("Cache directory {} is writable by other users".format(cache_dir))
+
+class ParseCache(object):
+    def __init__(self, cache_dir, max_size=DEFAULT_CACHE_SIZE):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.version = schema_version()
+        os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+        check_cache_dir(cache_dir)
+
+    def key(self, input_file):
+        digest = hashlib.sha256(self.version.encode())
+        for chunk in iter(lambda: input_file.read(2**20), b''):
+            digest.update(chunk)
+        return digest.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, key + CACHE_SUFFIX)
+
+    def load(self, key):
+        cache_path = self.path(key)
+        try:
+            with open(cache_path, 'rb') as cache_file:
+                # Unpickling creates many objects, cyclic GC runs would only slow it down
+                gc_enabled = gc.isenabled()
+                gc.disable()
+                try:
+                    document = pickle.load(cache_file)
+                finally:
+                    if gc_enabled:
+                        gc.enable()
+        except FileNotFoundError:
+            return None
+        except Exception:
+            # Truncated or otherwise unusable entry, parse again
+            self.remove(cache_path)
+            return None
+        # Entries are evicted by least recent use
+        try:
+            os.utime(cache_path)
+        except FileNotFoundError:
+            # Evicted by another process meanwhile, the loaded document is still valid
+            pass
+        return document
+
+    def store(self, key, document):
+        fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as temp_file:
+                pickle.dump(document, temp_file, pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, self.path(key))
+        except BaseException:
+            self.remove(temp_path)
+            raise
+        self.evict()
+
+    def entries(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(CACHE_SUFFIX):
+                try:
+                    stat = os.stat(os.path.join(self.cache_dir, name))
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, name))
+        return sorted(entries)
+
+    def evict(self):
+        entries = self.entries()
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, name in entries:
+            if total_size <= self.max_size:
+                break
+            self.remove(os.path.join(self.cache_dir, name))
+            total_size -= size
+
+    @staticmethod
+    def remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+import argparse
+import bisect
+import json
+import os
+import shlex
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from pf_focus.batch import batch_input_paths
+from pf_focus.cache import CACHE_DIR_HELP, DEFAULT_CACHE_SIZE, ParseCache
+from pf_focus.markdown import output_markdown_table
+from pf_focus.parse import PARSER_BACKENDS, parse_pfsense, parse_pfsense_cached
+from pf_focus.pfsense import PfSenseDocument
+from pf_focus.util import getattr_r
+
+
+# Matches every query value of a field, e.g. a rule without protocol or with source "any"
+WILDCARD = '*'
+# Matches every query value but "any", i.e. a negated source or destination
+NEGATION = '!'
+PORT_PROTOCOLS = {WILDCARD, 'tcp', 'udp'}
+QUERY_FIELDS = ('firewall', 'section', 'type', 'interface', 'ipprotocol', 'protocol', 'source', 'destination', 'port')
+RULE_COLUMNS = (('Firewall', 'firewall'), ('Section', 'section'), ('#', 'position'), ('Type', 'type'), ('Interface', 'interface'),
+                ('IP', 'ipprotocol'), ('Protocol', 'protocol'), ('Source', 'source'), ('Destination', 'destination'),
+                ('Port', 'port'), ('Description', 'descr'))
+
+def node_string(node):
+    return None if node is None else node.string
+
+def expand_alias(doc, name, seen=None):
+    """Members of an alias, nested aliases are expanded and listed as well"""
+    if seen is None:
+        seen = set()
+    alias_data = doc.alias_index.get(name)
+    if alias_data is None or name in seen:
+        return []
+    seen.add(name)
+    members = []
+    for member in (alias_data.get('address') or '').split():
+        members.append(member)
+        members.extend(expand_alias(doc, member, seen))
+    return members
+
+def address_tokens(doc, address):
+    tokens = {address}
+    interface_data = doc.resolve_interface(address, ip_suffix=True)
+    if not interface_data is None and 'descr' in interface_data['interface']:
+        tokens.add(str(interface_data['interface']['descr']) + ('ip' if not address in doc.interface_index else ''))
+    tokens.update(expand_alias(doc, address))
+    for network in doc.resolve_addresses(address).networks:
+        tokens.add(str(network))
+        if network.prefixlen == network.max_prefixlen:
+            tokens.add(str(network.network_address))
+    return tokens
+
+def location_tokens(doc, location):
+    """Display string and index tokens of a rule source or destination"""
+    if location is None or hasattr(location, 'any'):
+        return 'any', {WILDCARD}
+    address = node_string(getattr(location, 'address', None)) or node_string(getattr(location, 'network', None))
+    if address is None:
+        return 'any', {WILDCARD}
+    if hasattr(location, 'not'):
+        # Negations match almost everything, so they are not narrowed down any further
+        return '!' + address, {NEGATION}
+    return address, address_tokens(doc, address)
+
+def port_ranges(doc, port):
+    """Port ranges of a port string or port alias, None if they cannot be determined"""
+    if port is None:
+        return None
+    return list(doc.resolve_ports(port).ranges) or None
+
+def protocol_tokens(protocol):
+    if protocol is None or protocol == 'any':
+        return {WILDCARD}
+    return {protocol} | set(protocol.split('/'))
+
+def ipprotocol_tokens(ipprotocol):
+    if ipprotocol is None:
+        return {WILDCARD}
+    elif ipprotocol == 'inet46':
+        return {'inet46', 'inet', 'inet6'}
+    return {ipprotocol}
+
+def interface_tokens(doc, interfaces):
+    tokens = set()
+    for interface in interfaces:
+        tokens.add(interface)
+        interface_data = doc.resolve_interface(interface)
+        if not interface_data is None and 'descr' in interface_data['interface']:
+            tokens.add(str(interface_data['interface']['descr']))
+    return tokens
+
+def rule_entry(doc, firewall, section, position, rule):
+    """A rule as (record, tokens, port ranges), where record holds what is shown for a match"""
+    interfaces = (node_string(getattr(rule, 'interface', None)) or '').split(',')
+    interfaces = [interface for interface in interfaces if interface]
+    source, source_tokens = location_tokens(doc, getattr(rule, 'source', None))
+    destination, destination_tokens = location_tokens(doc, getattr(rule, 'destination', None))
+    port = node_string(getattr_r(rule, 'destination.port'))
+    protocol = node_string(getattr(rule, 'protocol', None))
+    ipprotocol = node_string(getattr(rule, 'ipprotocol', None))
+    rule_type = node_string(getattr(rule, 'type', None)) or section
+    record = {
+        'firewall': firewall['hostname'],
+        'path': firewall['path'],
+        'section': section,
+        'position': position,
+        'type': rule_type,
+        'disabled': hasattr(rule, 'disabled'),
+        'interface': interfaces,
+        'ipprotocol': ipprotocol,
+        'protocol': protocol,
+        'source': source,
+        'destination': destination,
+        'port': port,
+        'descr': node_string(getattr(rule, 'descr', None)),
+    }
+    tokens = {
+        'firewall': {firewall['hostname'], firewall['name']},
+        'section': {section},
+        'type': {rule_type},
+        'interface': interface_tokens(doc, interfaces),
+        'ipprotocol': ipprotocol_tokens(ipprotocol),
+        'protocol': protocol_tokens(protocol),
+        'source': source_tokens,
+        'destination': destination_tokens,
+    }
+    if protocol_tokens(protocol) & PORT_PROTOCOLS:
+        ranges = port_ranges(doc, port)
+    else:
+        # Without TCP or UDP there are no ports, so no port query matches
+        ranges = []
+    return record, tokens, ranges
+
+def document_entries(doc, input_path, include_disabled=False):
+    hostname = node_string(getattr_r(doc, 'pfsense.system.hostname'))
+    name = os.path.splitext(os.path.basename(input_path))[0]
+    firewall = {'hostname': hostname or name, 'name': name, 'path': input_path}
+    entries = []
+    for section, path in (('filter', 'pfsense.filter.rule'), ('nat', 'pfsense.nat.rule')):
+        for position, rule in enumerate(getattr_r(doc, path) or (), 1):
+            if include_disabled or not hasattr(rule, 'disabled'):
+                entries.append(rule_entry(doc, firewall, section, position, rule))
+    return entries
+
+def index_file(input_path, parser='sax', cache_dir=None, cache_size=DEFAULT_CACHE_SIZE, include_disabled=False):
+    """Parses one backup and returns its rule entries, which are small enough to send between processes"""
+    doc = PfSenseDocument()
+    if cache_dir is None:
+        parse_pfsense(input_path, doc, parser)
+    else:
+        doc, _ = parse_pfsense_cached(input_path, doc, ParseCache(cache_dir, cache_size), parser)
+    return document_entries(doc, input_path, include_disabled)
+
+class RuleIndex(object):
+    """Inverted index from field tokens to rule ids, queries intersect the posting sets of their fields"""
+
+    def __init__(self):
+        self.records = []
+        self.postings = dict((field, {}) for field in QUERY_FIELDS if field != 'port')
+        self.exact_ports = {}
+        self.port_ranges = []
+        self.any_ports = set()
+
+    def add(self, record, tokens, ranges):
+        rule_id = len(self.records)
+        self.records.append(record)
+        for field, field_tokens in tokens.items():
+            postings = self.postings[field]
+            for token in field_tokens:
+                postings.setdefault(token.lower(), set()).add(rule_id)
+        if ranges is None:
+            self.any_ports.add(rule_id)
+            return
+        for low, high in ranges:
+            if low == high:
+                self.exact_ports.setdefault(low, set()).add(rule_id)
+            else:
+                bisect.insort(self.port_ranges, (low, high, rule_id))
+
+    def port_matches(self, value):
+        if value == 'any':
+            return set(self.any_ports)
+        if not value.isdigit():
+            raise ValueError("Invalid port: {}".format(value))
+        port = int(value)
+        matches = self.any_ports | self.exact_ports.get(port, set())
+        # Ranges are sorted by their lower bound, only those starting at or below the port can contain it
+        for low, high, rule_id in self.port_ranges[:bisect.bisect_right(self.port_ranges, (port, float('inf')))]:
+            if high >= port:
+                matches.add(rule_id)
+        return matches
+
+    def field_matches(self, field, value):
+        if field == 'port':
+            return self.port_matches(value)
+        postings = self.postings[field]
+        value = value.lower()
+        if value == 'any':
+            return set(postings.get(WILDCARD, ()))
+        return postings.get(value, set()) | postings.get(WILDCARD, set()) | postings.get(NEGATION, set())
+
+    def query(self, conditions):
+        """Ids of the rules matching all (field, value) conditions, in the order they were added"""
+        matches = None
+        for field, value in conditions:
+            field_matches = self.field_matches(field, value)
+            matches = field_matches if matches is None else matches & field_matches
+            if not matches:
+                return []
+        if matches is None:
+            return list(range(len(self.records)))
+        return sorted(matches)
+
+def parse_query(query):
+    conditions = []
+    for term in shlex.split(query):
+        field, separator, value = term.partition('=')
+        if not separator or not field in QUERY_FIELDS:
+            raise ValueError("Invalid query term: {}, expected one of {} followed by =value".format(term, ', '.join(QUERY_FIELDS)))
+        conditions.append((field, value))
+    return conditions
+
+def build_index(input_paths, parser='sax', jobs=None, cache_dir=None, cache_size=DEFAULT_CACHE_SIZE, include_disabled=False):
+    """Parses backups in worker processes, returns the index and (path, error) pairs of failed backups"""
+    index = RuleIndex()
+    results = {}
+    errors = []
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = {}
+        for input_path in input_paths:
+            future = executor.submit(index_file, input_path, parser, cache_dir, cache_size, include_disabled)
+            futures[future] = input_path
+        for future in as_completed(futures):
+            try:
+                results[futures[future]] = future.result()
+            except Exception as e:
+                errors.append((futures[future], '{}: {}'.format(type(e).__name__, e)))
+    # Rule ids follow the order of the input paths, whichever worker finished first
+    for input_path in input_paths:
+        for entry in results.get(input_path, ()):
+            index.add(*entry)
+    return index, errors
+
+def format_rule_cell(value):
+    if value is None:
+        return ''
+    elif isinstance(value, list):
+        return ', '.join(value)
+    return str(value)
+
+def output_matches_markdown(index, query, rule_ids, stream):
+    stream.write("## {}\n".format(query))
+    firewalls = set(index.records[rule_id]['path'] for rule_id in rule_ids)
+    stream.write("{} rules on {} firewalls\n".format(len(rule_ids), len(firewalls)))
+    if rule_ids:
+        stream.write("\n")
+        rows = ([format_rule_cell(index.records[rule_id][attribute]) for _, attribute in RULE_COLUMNS] for rule_id in rule_ids)
+        output_markdown_table(stream, tuple(header for header, _ in RULE_COLUMNS), rows)
+    stream.write("\n")
+
+def output_matches_jsonl(index, query, rule_ids, stream):
+    for rule_id in rule_ids:
+        record = {'query': query}
+        record.update(index.records[rule_id])
+        stream.write(json.dumps(record))
+        stream.write('\n')
+
+MATCH_FORMATS = {
+    'md': output_matches_markdown,
+    'jsonl': output_matches_jsonl,
+}
+
+def iter_queries(args):
+    if args.queries:
+        yield from args.queries
+        return
+    interactive = sys.stdin.isatty()
+    while True:
+        if interactive:
+            print('query> ', end='', file=sys.stderr, flush=True)
+        line = sys.stdin.readline()
+        if not line:
+            break
+        line = line.strip()
+        if line and not line.startswith('#'):
+            yield line
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Index the rules of many backups and query them, e.g. \"protocol=tcp port=3389 source=any type=pass\"")
+    parser.add_argument("input_paths", nargs='+', help="XML input paths or directories of XML files")
+    parser.add_argument("-q", dest="quiet", action="store_const", const=True, default=False, help="Hide progress messages")
+    parser.add_argument("-e", dest="queries", action="append", help="Query, repeatable (default: read queries from stdin, one per line)")
+    parser.add_argument("-f", dest="output_format", help="Output format", default="md", choices=MATCH_FORMATS.keys())
+    parser.add_argument("-j", dest="jobs", help="Number of parallel parse processes (default: number of CPUs)", type=int)
+    parser.add_argument("--include-disabled", dest="include_disabled", action="store_const", const=True, default=False, help="Index disabled rules as well")
+    parser.add_argument("--parser", dest="parser", help="XML parser backend", default="sax", choices=PARSER_BACKENDS.keys())
+    parser.add_argument("--cache-dir", dest="cache_dir", help=CACHE_DIR_HELP)
+    parser.add_argument("--cache-size", dest="cache_size", help="Maximum cache size in MB", type=int, default=DEFAULT_CACHE_SIZE // 2**20)
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    input_paths = []
+    for input_path in args.input_paths:
+        if os.path.isdir(input_path):
+            input_paths.extend(batch_input_paths(input_path))
+        else:
+            input_paths.append(input_path)
+
+    index, errors = build_index(input_paths, args.parser, args.jobs, args.cache_dir, args.cache_size * 2**20, args.include_disabled)
+    for input_path, error in errors:
+        print('\u2717 {}: {}'.format(input_path, error), file=sys.stderr)
+    if not args.quiet:
+        print('\u268d Indexed {} rules of {} backups.'.format(len(index.records), len(input_paths) - len(errors)), file=sys.stderr)
+
+    output_func = MATCH_FORMATS[args.output_format]
+    for query in iter_queries(args):
+        try:
+            rule_ids = index.query(parse_query(query))
+        except ValueError as e:
+            print('\u2717 {}'.format(e), file=sys.stderr)
+            continue
+        output_func(index, query, rule_ids, sys.stdout)
+        sys.stdout.flush()
+    if errors:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+import argparse
+import bisect
+import hashlib
+import json
+import sys
+
+import yaml
+
+from pf_focus.cache import CACHE_DIR_HELP, DEFAULT_CACHE_SIZE, ParseCache
+from pf_focus.markdown import output_markdown_table
+from pf_focus.parse import PARSER_BACKENDS, parse_pfsense, parse_pfsense_cached
+from pf_focus.pfsense import PfSenseDocument, PfSenseNode, PfSenseString
+from pf_focus.util import DataList, DataNode, getattr_r, obj_attributes
+from pf_focus.yamldump import YamlDumper
+
+
+def raw_data(value):
+    """Like get_data(), but keeps alias and interface references unresolved"""
+    if isinstance(value, PfSenseString):
+        return value.string
+    elif isinstance(value, DataList):
+        return [raw_data(item) for item in value]
+    elif isinstance(value, PfSenseNode) and value._schema:
+        # Containers are taken apart, so that derived data like resolved alias members is left out
+        return dict((name, raw_data(child)) for name, child in obj_attributes(value).items() if not name.startswith('_'))
+    elif isinstance(value, DataNode):
+        return value.get_data(cache=False)
+    return value
+
+def content_hash(data):
+    content = json.dumps(data, sort_keys=True, default=str)
+    return hashlib.sha1(content.encode()).hexdigest()[:12]
+
+def flatten(data, prefix=''):
+    if isinstance(data, dict) and data:
+        for name, value in data.items():
+            yield from flatten(value, '{}{}.'.format(prefix, name))
+    elif isinstance(data, list) and data:
+        for i, value in enumerate(data):
+            yield from flatten(value, '{}{}.'.format(prefix, i))
+    else:
+        yield prefix[:-1], data
+
+class DiffSection(object):
+    """Records found at path, matched by the first of the key attributes they have"""
+
+    def __init__(self, name, path, keys=(), ordered=False, exclude=()):
+        self.name = name
+        self.path = path
+        self.keys = keys
+        self.ordered = ordered
+        self.exclude = exclude
+
+    def record_data(self, element):
+        data = raw_data(element)
+        for name in self.exclude:
+            data.pop(name, None)
+        return data
+
+    def elements(self, pfsense):
+        elements = getattr_r(pfsense, self.path)
+        if elements is None:
+            return ()
+        if not isinstance(elements, DataList):
+            return (elements,)
+        return elements
+
+    def record_key(self, element):
+        for key in self.keys:
+            value = getattr_r(element, key)
+            value = None if value is None else raw_data(value)
+            # pfSense writes empty elements like <associated-rule-id></associated-rule-id>, they identify nothing
+            if not value is None and value != '':
+                return '{}={}'.format(key, value)
+        return None
+
+    def records(self, pfsense):
+        for element in self.elements(pfsense):
+            yield self.record_key(element), self.record_data(element)
+
+class NamedChildrenSection(DiffSection):
+    """Records are the children of the node at path, matched by their tag"""
+
+    def records(self, pfsense):
+        for parent in self.elements(pfsense):
+            for name, child in obj_attributes(parent).items():
+                if not name.startswith('_'):
+                    yield name, self.record_data(child)
+
+class DhcpdSection(DiffSection):
+    """Records below every DHCP interface, matched by interface and key"""
+
+    def records(self, pfsense):
+        dhcpd = getattr_r(pfsense, 'dhcpd')
+        if dhcpd is None:
+            return
+        for dhcpd_interface_name, dhcpd_interface in obj_attributes(dhcpd).items():
+            if dhcpd_interface_name.startswith('_'):
+                continue
+            for element in getattr_r(dhcpd_interface, self.path) or ():
+                key = self.record_key(element)
+                data = self.record_data(element)
+                if key is None:
+                    key = 'hash={}'.format(content_hash(data))
+                yield '{}/{}'.format(dhcpd_interface_name, key), data
+
+DIFF_SECTIONS = (
+    DiffSection('system', 'system'),
+    NamedChildrenSection('interfaces', 'interfaces'),
+    DiffSection('vlans', 'vlans.vlan', ('vlanif',)),
+    DiffSection('bridges', 'bridges.bridged', ('bridgeif',)),
+    DiffSection('gateways', 'gateways.gateway_item', ('name',)),
+    DiffSection('staticroutes', 'staticroutes.route', ('network',)),
+    # Static mappings are compared on their own
+    NamedChildrenSection('dhcpd', 'dhcpd', exclude=('staticmap',)),
+    DhcpdSection('dhcpd_staticmaps', 'staticmap', ('mac',)),
+    DiffSection('aliases', 'aliases.alias', ('name',)),
+    # The associated filter rule can be added or removed later, the creation time stays
+    DiffSection('nat_rules', 'nat.rule', ('created.time', 'associated_rule_id'), ordered=True),
+    DiffSection('nat_outbound_rules', 'nat.outbound.rule', ('created.time',), ordered=True),
+    DiffSection('filter_rules', 'filter.rule', ('tracker', 'id', 'created.time'), ordered=True),
+    DiffSection('dnsmasq', 'dnsmasq'),
+    DiffSection('openvpn_servers', 'openvpn.openvpn_server', ('vpnid',)),
+    DiffSection('openvpn_clients', 'openvpn.openvpn_client', ('vpnid',)),
+    DiffSection('openvpn_cscs', 'openvpn.openvpn_csc', ('common_name',)),
+    DiffSection('syslog', 'syslog'),
+    DiffSection('sysctl', 'sysctl.item', ('tunable',)),
+)
+
+def index_records(section, records):
+    index = {}
+    for key, data in records:
+        if key is None:
+            # Records without an identity match when their content is identical
+            key = 'hash={}'.format(content_hash(data)) if section.keys else section.name
+        unique_key, occurrence = key, 1
+        while unique_key in index:
+            occurrence += 1
+            unique_key = '{}#{}'.format(key, occurrence)
+        index[unique_key] = data
+    return index
+
+def moved_keys(old_keys, new_positions):
+    """Keys outside of a longest increasing subsequence of new positions, i.e. the fewest moves explaining the new order"""
+    tails, tail_indexes, previous = [], [], [None] * len(old_keys)
+    for i, key in enumerate(old_keys):
+        position = new_positions[key]
+        j = bisect.bisect_left(tails, position)
+        if j == len(tails):
+            tails.append(position)
+            tail_indexes.append(i)
+        else:
+            tails[j] = position
+            tail_indexes[j] = i
+        previous[i] = tail_indexes[j - 1] if j else None
+    stable = set()
+    i = tail_indexes[-1] if tail_indexes else None
+    while not i is None:
+        stable.add(old_keys[i])
+        i = previous[i]
+    return [key for key in old_keys if not key in stable]
+
+def diff_section(section, old_pfsense, new_pfsense):
+    old_index = index_records(section, section.records(old_pfsense))
+    new_index = index_records(section, section.records(new_pfsense))
+
+    result = {}
+    added = [{'key': key, 'record': data} for key, data in new_index.items() if not key in old_index]
+    removed = [{'key': key, 'record': data} for key, data in old_index.items() if not key in new_index]
+    changed = []
+    for key, old_data in old_index.items():
+        new_data = new_index.get(key)
+        if new_data is None or new_data == old_data:
+            continue
+        old_fields, new_fields = dict(flatten(old_data)), dict(flatten(new_data))
+        changes = {}
+        for field in sorted(set(old_fields) | set(new_fields)):
+            old_value, new_value = old_fields.get(field), new_fields.get(field)
+            if old_value != new_value:
+                changes[field] = {'old': old_value, 'new': new_value}
+        changed.append({'key': key, 'changes': changes})
+    if added:
+        result['added'] = added
+    if removed:
+        result['removed'] = removed
+    if changed:
+        result['changed'] = changed
+    if section.ordered:
+        new_positions = dict((key, position) for position, key in enumerate(new_index))
+        moved = moved_keys([key for key in old_index if key in new_positions], new_positions)
+        if moved:
+            result['moved'] = moved
+    return result
+
+def diff_documents(old_doc, new_doc, sections=DIFF_SECTIONS):
+    diff = {}
+    for section in sections:
+        section_diff = diff_section(section, old_doc.pfsense, new_doc.pfsense)
+        if section_diff:
+            diff[section.name] = section_diff
+    return diff
+
+def output_diff_yaml(diff, stream):
+    yaml.dump(diff, stream, Dumper=YamlDumper, sort_keys=False)
+
+def output_diff_json(diff, stream):
+    json.dump(diff, stream, indent=2, default=str)
+    stream.write('\n')
+
+def format_record(data):
+    for name in ('descr', 'description', 'name'):
+        if isinstance(data.get(name), str):
+            return data[name]
+    return ''
+
+def output_diff_markdown(diff, stream):
+    stream.write("# pfSense configuration diff\n")
+    if not diff:
+        stream.write("No differences.\n")
+        return
+    counts = [(name, len(section_diff.get('added', ())), len(section_diff.get('removed', ())),
+               len(section_diff.get('changed', ())), len(section_diff.get('moved', ()))) for name, section_diff in diff.items()]
+    output_markdown_table(stream, ('Section', 'Added', 'Removed', 'Changed', 'Moved'), counts)
+    stream.write("\n")
+    for name, section_diff in diff.items():
+        stream.write("## {}\n".format(name))
+        for change_type in ('added', 'removed'):
+            if change_type in section_diff:
+                stream.write("### {}\n".format(change_type.capitalize()))
+                rows = [(entry['key'], format_record(entry['record'])) for entry in section_diff[change_type]]
+                output_markdown_table(stream, ('Key', 'Description'), rows)
+                stream.write("\n")
+        if 'changed' in section_diff:
+            stream.write("### Changed\n")
+            rows = [(entry['key'], field, values['old'], values['new'])
+                    for entry in section_diff['changed'] for field, values in entry['changes'].items()]
+            output_markdown_table(stream, ('Key', 'Field', 'Old', 'New'), rows)
+            stream.write("\n")
+        if 'moved' in section_diff:
+            stream.write("### Moved\n")
+            output_markdown_table(stream, ('Key',), [(key,) for key in section_diff['moved']])
+            stream.write("\n")
+
+DIFF_FORMATS = {
+    'yaml': output_diff_yaml,
+    'json': output_diff_json,
+    'md': output_diff_markdown,
+}
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("old_path", help="XML input path of the old backup")
+    parser.add_argument("new_path", help="XML input path of the new backup")
+    parser.add_argument("-o", dest="output_path", help="Output path", default="-")
+    parser.add_argument("-f", dest="output_format", help="Output format", default="yaml", choices=DIFF_FORMATS.keys())
+    parser.add_argument("--parser", dest="parser", help="XML parser backend", default="sax", choices=PARSER_BACKENDS.keys())
+    parser.add_argument("--cache-dir", dest="cache_dir", help=CACHE_DIR_HELP)
+    parser.add_argument("--cache-size", dest="cache_size", help="Maximum cache size in MB", type=int, default=DEFAULT_CACHE_SIZE // 2**20)
+    return parser.parse_args()
+
+def parse_document(args, input_path):
+    doc = PfSenseDocument()
+    if args.cache_dir:
+        doc, _ = parse_pfsense_cached(input_path, doc, ParseCache(args.cache_dir, args.cache_size * 2**20), args.parser)
+    else:
+        parse_pfsense(input_path, doc, args.parser)
+    return doc
+
+def main():
+    args = parse_args()
+    diff = diff_documents(parse_document(args, args.old_path), parse_document(args, args.new_path))
+    output_func = DIFF_FORMATS[args.output_format]
+    if args.output_path == '-':
+        output_func(diff, sys.stdout)
+    else:
+        with open(args.output_path, 'w+') as output_file:
+            output_func(diff, output_file)
+
+if __name__ == '__main__':
+    main()
@@ -1,75 +1,201 @@
 #!/usr/bin/env python3
 import argparse
 import sys
+import time
 
-import yaml
-
-from pf_focus.markdown import output_markdown
-from pf_focus.bbcode import output_bbcode
-from pf_focus.parse import parse_pfsense
+from pf_focus.cache import CACHE_DIR_HELP, DEFAULT_CACHE_SIZE, ParseCache
+from pf_focus.formats import BUILTIN_FORMATS, OUTPUT_FORMATS, SECTIONED_FORMATS, sharing_sections
+from pf_focus.parse import PARSER_BACKENDS, parse_pfsense, parse_pfsense_cached
 from pf_focus.pfsense import PfSenseDocument
-from pf_focus.progress import Animation
+from pf_focus.progress import Progress, ProgressWriter
+from pf_focus.timings import TIMINGS_FORMATS, CountingWriter, Timings, collecting, timed, write_timings
 
 
-def output_yaml(doc, stream):
-    yaml.safe_dump(doc.data, stream)
+# Output formats, batch processing and the streaming renderer are imported
+# only when a run uses them, short runs should not pay for everything else.
 
-OUTPUT_FORMATS = {
-    'yaml': output_yaml,
-    'md': output_markdown,
-    'bbcode': output_bbcode,
-}
+def get_progress(args, label, output_format=None):
+    quiet = args.quiet or '-' in args.output_paths
+    if output_format in SECTIONED_FORMATS:
+        from pf_focus.report import REPORT_SECTIONS
+        return Progress(label, total_items=len(REPORT_SECTIONS), item_name='sections', quiet=quiet)
+    if not output_format is None:
+        return Progress(label, item_name='writes', quiet=quiet)
+    return Progress(label, quiet=quiet)
 
-def get_output_func(args):
-    return OUTPUT_FORMATS.get(args.output_format, output_yaml)
+def output_tracked(doc, output_format, output_file, progress):
+    if not progress is None:
+        output_file = ProgressWriter(output_file, progress)
+    if collecting():
+        output_file = CountingWriter(output_file, format=output_format)
+    with timed('output', format=output_format):
+        OUTPUT_FORMATS[output_format](doc, output_file)
 
-def get_progress_animation(args):
-    return Animation(args.quiet or args.output_path == '-')
+def get_parse_cache(args):
+    if args.cache_dir:
+        return ParseCache(args.cache_dir, args.cache_size * 2**20)
+    return None
 
 def parse_args():
     parser = argparse.ArgumentParser()
     parser.add_argument("-q", dest="quiet", action="store_const", const=True, default=False, help="Hide progress messages")
-    parser.add_argument("-i", dest="input_path", help="XML input path", required=True)
-    parser.add_argument("-o", dest="output_path", help="Output path", default="-")
-    parser.add_argument("-f", dest="output_format", help="Output format", default="yaml", choices=OUTPUT_FORMATS.keys())
-    return parser.parse_args()
+    input_group = parser.add_mutually_exclusive_group(required=True)
+    input_group.add_argument("-i", dest="input_path", help="XML input path")
+    input_group.add_argument("--batch", dest="batch_dir", help="Directory with XML input files")
+    parser.add_argument("-o", dest="output_paths", help="Output path, repeatable to pair with each -f", action="append")
+    parser.add_argument("-O", dest="output_dir", help="Output directory for --batch")
+    parser.add_argument("-f", dest="output_formats", help="Output format, repeatable: {} or an installed plugin format".format(', '.join(BUILTIN_FORMATS)),
+                        action="append")
+    parser.add_argument("-j", dest="jobs", help="Parallel jobs for --batch", type=int, default=None)
+    parser.add_argument("--parser", dest="parser", help="XML parser backend", default="sax", choices=PARSER_BACKENDS.keys())
+    parser.add_argument("--stream", dest="stream", action="store_const", const=True, default=False, help="Output Markdown sections while parsing, earlier but not with less memory")
+    parser.add_argument("--cache-dir", dest="cache_dir", help=CACHE_DIR_HELP)
+    parser.add_argument("--cache-size", dest="cache_size", help="Maximum cache size in MB", type=int, default=DEFAULT_CACHE_SIZE // 2**20)
+    parser.add_argument("--timings", dest="timings_path", nargs="?", const="-", help="Report stage timings and counters, to stderr or a path")
+    parser.add_argument("--timings-format", dest="timings_format", help="Timings report format", default="text", choices=TIMINGS_FORMATS.keys())
+    parser.add_argument("--profile", dest="profile_path", help="Write a cProfile dump of the run to a path")
+    args = parser.parse_args()
+    args.output_formats = args.output_formats or ['yaml']
+    for output_format in args.output_formats:
+        if not output_format in OUTPUT_FORMATS:
+            parser.error("unknown output format {!r} (choose from {})".format(output_format, ', '.join(OUTPUT_FORMATS)))
+    if args.batch_dir:
+        if not args.output_dir:
+            parser.error("--batch requires an output directory (-O)")
+        elif args.output_paths:
+            parser.error("--batch writes to the output directory (-O), output paths (-o) cannot be used")
+    elif args.output_dir:
+        parser.error("an output directory (-O) is only supported with --batch")
+    args.output_paths = args.output_paths or ['-']
+    if not args.batch_dir:
+        if len(args.output_paths) != len(args.output_formats):
+            parser.error("every output format (-f) needs its own output path (-o)")
+        elif args.output_paths.count('-') > 1:
+            parser.error("only one output can be written to stdout")
+    if args.stream and (args.batch_dir or args.output_formats != ['md']):
+        parser.error("--stream is only supported for a single input with the md output format")
+    if args.timings_path and args.batch_dir:
+        parser.error("--timings is only supported for a single input")
+    return args
 
-def step_parse(args, doc):
+def step_parse(args):
     if not args.quiet:
         print('\u268b Parsing "{}" ...'.format(args.input_path), file=sys.stderr)
-    with get_progress_animation(args):
-        parse_pfsense(args.input_path, doc)
+    cache = get_parse_cache(args)
+    with get_progress(args, '\u268b') as progress, timed('parse'):
+        doc, handler = PfSenseDocument(), None
+        if cache is None:
+            parse_pfsense(args.input_path, doc, args.parser, progress=progress)
+        else:
+            doc, handler = parse_pfsense_cached(args.input_path, doc, cache, args.parser, progress=progress)
     if not args.quiet:
-        print('\u268d Successfully parsed pfSense config version {}.'.format(doc.pfsense.version), file=sys.stderr)
+        source = 'cached' if cache and handler is None else 'parsed'
+        print('\u268d Successfully {} pfSense config version {}.'.format(source, doc.pfsense.version), file=sys.stderr)
+    return doc
 
-def step_stdout(args, doc, output_func):
+def step_stdout(args, doc, output_format):
     if not args.quiet:
         print('\u2631 Outputting to stdout ...', file=sys.stderr)
-    with get_progress_animation(args):
-        output_file = sys.stdout
-        output_func(doc, output_file)
+    with get_progress(args, '\u2631', output_format) as progress:
+        output_tracked(doc, output_format, sys.stdout, progress)
     if not args.quiet:
-        print('\u2630 Successfully outputted pfSense config as {}.'.format(args.output_format), file=sys.stderr)
+        print('\u2630 Successfully outputted pfSense config as {}.'.format(output_format), file=sys.stderr)
 
-def step_file(args, doc, output_func):
+def step_file(args, doc, output_format, output_path):
     if not args.quiet:
-        print('\u2631 Outputting to "{}" ...'.format(args.output_path), file=sys.stderr)
-    with get_progress_animation(args):
-        with open(args.output_path, 'w+') as output_file:
-            output_func(doc, output_file)
+        print('\u2631 Outputting to "{}" ...'.format(output_path), file=sys.stderr)
+    with get_progress(args, '\u2631', output_format) as progress:
+        with open(output_path, 'w+') as output_file:
+            output_tracked(doc, output_format, output_file, progress)
     if not args.quiet:
-        print('\u2630 Successfully outputted pfSense config as {}.'.format(args.output_format), file=sys.stderr)
+        print('\u2630 Successfully outputted pfSense config as {}.'.format(output_format), file=sys.stderr)
 
-def main():
-    args = parse_args()
-    doc = PfSenseDocument()
-    output_func = get_output_func(args)
+def step_stream(args, output_file):
+    if not args.quiet:
+        print('\u268b Parsing "{}" and streaming sections ...'.format(args.input_path), file=sys.stderr)
+    from pf_focus.markdown import StreamingMarkdown
+    cache = get_parse_cache(args)
+    with get_progress(args, '\u268b') as progress, timed('parse'):
+        doc = PfSenseDocument()
+        renderer = StreamingMarkdown(doc, output_file)
+        if cache is None:
+            parse_pfsense(args.input_path, doc, args.parser, renderer.section_closed, progress)
+        else:
+            # A cache hit closes no sections, finish() then renders all of them
+            doc, _ = parse_pfsense_cached(args.input_path, doc, cache, args.parser, renderer.section_closed, progress)
+            renderer.doc = doc
+        renderer.finish()
+    if not args.quiet:
+        print('\u2630 Successfully outputted pfSense config version {} as md.'.format(doc.pfsense.version), file=sys.stderr)
+
+def step_batch(args):
+    from pf_focus.batch import run_batch
+    if not args.quiet:
+        print('\u268b Processing "{}" into "{}" ...'.format(args.batch_dir, args.output_dir), file=sys.stderr)
+    start = time.perf_counter()
+    processed, failures = 0, 0
+    results = run_batch(args.batch_dir, args.output_dir, args.output_formats, args.parser, args.jobs, args.cache_dir, args.cache_size * 2**20)
+    for input_path, seconds, error in results:
+        processed += 1
+        if error is None:
+            if not args.quiet:
+                print('\u2630 {} ({:.2f} s)'.format(input_path, seconds), file=sys.stderr)
+        else:
+            failures += 1
+            print('\u2717 {}: {}'.format(input_path, error), file=sys.stderr)
+    if not args.quiet:
+        print('\u268d Processed {} files with {} failures in {:.2f} s.'.format(processed, failures, time.perf_counter() - start), file=sys.stderr)
+    return failures
 
-    step_parse(args, doc)
-    if args.output_path == '-':
-        step_stdout(args, doc, output_func)
+def step_timings(args, timings):
+    if args.timings_path == '-':
+        TIMINGS_FORMATS[args.timings_format](timings, sys.stderr)
     else:
-        step_file(args, doc, output_func)
+        write_timings(timings, args.timings_path, args.timings_format)
+
+def run(args):
+    if args.batch_dir:
+        return step_batch(args)
+
+    if args.stream:
+        output_path = args.output_paths[0]
+        if output_path == '-':
+            step_stream(args, sys.stdout)
+        else:
+            with open(output_path, 'w+') as output_file:
+                step_stream(args, output_file)
+        return 0
+
+    # All outputs render from the same document and share its resolved data
+    doc = step_parse(args)
+    with sharing_sections(args.output_formats):
+        for output_format, output_path in zip(args.output_formats, args.output_paths):
+            if output_path == '-':
+                step_stdout(args, doc, output_format)
+            else:
+                step_file(args, doc, output_format, output_path)
+    return 0
+
+def main():
+    args = parse_args()
+    profiler = None
+    if args.profile_path:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        if args.timings_path:
+            with Timings() as timings:
+                failures = run(args)
+            step_timings(args, timings)
+        else:
+            failures = run(args)
+    finally:
+        if not profiler is None:
+            profiler.disable()
+            profiler.dump_stats(args.profile_path)
+    if failures:
+        sys.exit(1)
 
 if __name__ == '__main__':
     main()
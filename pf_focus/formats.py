@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+import importlib
+from collections.abc import Mapping
+from contextlib import nullcontext
+
+
+# Distributions add output formats as entry points of this group,
+# e.g. "html = mypackage.html:output_html" for a function (doc, stream)
+ENTRY_POINT_GROUP = 'pf_focus.formats'
+
+# Built-in output functions as "module:function", imported on first use only
+BUILTIN_FORMATS = {
+    'yaml': 'pf_focus.yamldump:output_yaml',
+    'md': 'pf_focus.markdown:output_markdown',
+    'bbcode': 'pf_focus.bbcode:output_bbcode',
+    'jsonl': 'pf_focus.jsonl:output_jsonl',
+}
+
+# Formats writing the sections of pf_focus.report, each section at once
+SECTIONED_FORMATS = ('md', 'bbcode')
+
+def iter_entry_points(group):
+    try:
+        from importlib.metadata import entry_points
+    except ImportError:
+        # Python < 3.8
+        try:
+            from importlib_metadata import entry_points
+        except ImportError:
+            return ()
+    installed = entry_points()
+    # Python < 3.10 returns a dict of groups
+    if hasattr(installed, 'select'):
+        return installed.select(group=group)
+    return installed.get(group, ())
+
+def load_function(spec):
+    if callable(spec):
+        return spec
+    if hasattr(spec, 'load'):
+        return spec.load()
+    module_name, _, function_name = spec.partition(':')
+    return getattr(importlib.import_module(module_name), function_name)
+
+class FormatRegistry(Mapping):
+    """Output functions by format name, each module is imported once its format is used
+
+    Entry points are only looked up for names that are not built in, or when
+    all names are listed, so that the common case does not scan installed
+    distributions.
+    """
+
+    def __init__(self, builtin_formats, group=ENTRY_POINT_GROUP):
+        self.specs = dict(builtin_formats)
+        self.group = group
+        self.discovered = False
+        self.functions = {}
+
+    def discover(self):
+        if self.discovered:
+            return
+        self.discovered = True
+        for entry_point in iter_entry_points(self.group):
+            # Built-in and registered formats take precedence
+            self.specs.setdefault(entry_point.name, entry_point)
+
+    def register(self, name, spec):
+        """Adds a format as a function or "module:function" spec"""
+        self.specs[name] = spec
+        self.functions.pop(name, None)
+
+    def __getitem__(self, name):
+        function = self.functions.get(name)
+        if function is None:
+            if not name in self.specs:
+                self.discover()
+            function = load_function(self.specs[name])
+            self.functions[name] = function
+        return function
+
+    def __contains__(self, name):
+        if not name in self.specs:
+            self.discover()
+        return name in self.specs
+
+    def __iter__(self):
+        self.discover()
+        return iter(self.specs)
+
+    def __len__(self):
+        self.discover()
+        return len(self.specs)
+
+def sharing_sections(output_formats):
+    """Context in which the formats rendered from one parse build each report section once"""
+    if sum(output_format in SECTIONED_FORMATS for output_format in output_formats) < 2:
+        return nullcontext()
+    from pf_focus.report import shared_sections
+    return shared_sections()
+
+OUTPUT_FORMATS = FormatRegistry(BUILTIN_FORMATS)
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+import json
+from datetime import datetime
+
+from pf_focus.timings import timed
+from pf_focus.util import getattr_r, hasattr_r, obj_attributes
+
+
+def json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError("Object of type {} is not JSON serializable".format(type(value).__name__))
+
+def named_children(node):
+    return sorted((name, child) for name, child in obj_attributes(node).items() if not name.startswith('_'))
+
+def element_records(path):
+    def iter_records(doc):
+        for element in getattr_r(doc.pfsense, path) or ():
+            # Uncached, so that memory does not grow with the number of records
+            yield element.get_data(cache=False)
+    return iter_records
+
+def interface_records(doc):
+    if hasattr_r(doc.pfsense, 'interfaces'):
+        for name, interface in named_children(doc.pfsense.interfaces):
+            record = {'name': name}
+            record.update(interface.get_data(cache=False))
+            yield record
+
+def dhcpd_staticmap_records(doc):
+    if hasattr_r(doc.pfsense, 'dhcpd'):
+        for name, dhcpd in named_children(doc.pfsense.dhcpd):
+            interface = doc.resolve_interface(name) or name
+            for staticmap in getattr(dhcpd, 'staticmap', ()):
+                record = {'interface': interface}
+                record.update(staticmap.get_data(cache=False))
+                yield record
+
+JSONL_SECTIONS = (
+    ('alias', element_records('aliases.alias')),
+    ('interface', interface_records),
+    ('vlan', element_records('vlans.vlan')),
+    ('bridge', element_records('bridges.bridged')),
+    ('gateway', element_records('gateways.gateway_item')),
+    ('staticroute', element_records('staticroutes.route')),
+    ('dhcpd_staticmap', dhcpd_staticmap_records),
+    ('nat_rule', element_records('nat.rule')),
+    ('nat_outbound_rule', element_records('nat.outbound.rule')),
+    ('filter_rule', element_records('filter.rule')),
+    ('dnsmasq_host', element_records('dnsmasq.hosts')),
+    ('dnsmasq_domainoverride', element_records('dnsmasq.domainoverrides')),
+    ('openvpn_server', element_records('openvpn.openvpn_server')),
+    ('openvpn_client', element_records('openvpn.openvpn_client')),
+    ('openvpn_csc', element_records('openvpn.openvpn_csc')),
+    ('sysctl', element_records('sysctl.item')),
+)
+
+def output_jsonl(doc, stream):
+    if not hasattr_r(doc, 'pfsense'):
+        return
+    # Records like static mappings have a hostname of their own, so the firewall gets its own key
+    firewall = getattr_r(doc.pfsense, 'system.hostname')
+    firewall = firewall.data if firewall else None
+    for section, iter_records in JSONL_SECTIONS:
+        with timed('section', format='jsonl', section=section):
+            for data in iter_records(doc):
+                record = {'section': section, 'firewall': firewall}
+                record.update(data)
+                stream.write(json.dumps(record, default=json_default))
+                stream.write('\n')
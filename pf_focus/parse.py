@@ -2,93 +2,197 @@
 import argparse
 import io
 import sys
-from pprint import pprint
 from xml.sax import ContentHandler
 
+from defusedxml.ElementTree import iterparse
 from defusedxml.sax import parse
 
+from pf_focus.cache import CACHE_DIR_HELP, DEFAULT_CACHE_SIZE, ParseCache
 from pf_focus.pfsense import PfSenseDocument
+from pf_focus.progress import ProgressReader, input_size
+from pf_focus.timings import collecting, count
 from pf_focus.util import DataList
 
 
 class PfSenseContentHandler(ContentHandler):
-    def __init__(self, document):
+    def __init__(self, document, section_callback=None):
         self.document = document
+        self.section_callback = section_callback
         self.stack = []
+        self.skip_depth = 0
+        self.skipped = {}
+        self.skipped_stats = None
+        self.elements = 0
+        self.chars = 0
+        # Nodes created per class, only while timings are collected
+        self.created = {} if collecting() else None
 
     def startDocument(self):
-        stack_chars = io.StringIO()
-        stack_frame = (self.document, None, 'element', stack_chars)
+        stack_frame = (self.document, None, None, None)
         self.stack.append(stack_frame)
 
     def startElement(self, name, attrs):
-        attr_name = name.replace('-', '_')
-        top, _, _, _ = self.stack[-1]
-
-        klass = None
-        klass_type = 'unknown'
-        klass_lookup = '_%s' % attr_name
-        klass = getattr(top, klass_lookup, None)
-        if isinstance(klass, list):
-            klass = klass[0]
-            klass_type = 'element'
-        elif not klass is None:
-            klass_type = 'attribute'
-        if not klass is None:
-            cur = klass(top)
-        else:
-            cur = None
+        self.elements += 1
+        if self.skip_depth:
+            self.skip_depth += 1
+            self.skipped_stats[1] += 1
+            return
+
+        top = self.stack[-1][0]
+        schema_entry = top.lookup_schema(name)
+        if schema_entry is None:
+            self.skip_depth = 1
+            self.skipped_stats = self.skipped.setdefault(name, [0, 0, 0])
+            self.skipped_stats[0] += 1
+            self.skipped_stats[1] += 1
+            return
+
+        klass, klass_type, attr_name = schema_entry
+        cur = klass(top, self.document)
+        if not self.created is None:
+            self.created[klass] = self.created.get(klass, 0) + 1
+
+        # Attach nodes right away so that the tree is usable while parsing
+        if klass_type == 'element':
+            elements = getattr(top, attr_name, None)
+            if elements is None:
+                elements = DataList()
+                setattr(top, attr_name, elements)
+            elements.append(cur)
 
-        stack_chars = io.StringIO()
-        stack_frame = (cur, name, klass_type, stack_chars)
+        elif klass_type == 'attribute':
+            setattr(top, attr_name, cur)
+
+        stack_frame = (cur, name, [], attr_name)
         self.stack.append(stack_frame)
 
     def characters(self, content):
-        cur, _, _, stack_chars = self.stack[-1]
+        self.chars += len(content)
+        if self.skip_depth:
+            self.skipped_stats[2] += len(content)
+            return
+        stack_chars = self.stack[-1][2]
         if not stack_chars is None:
-            stack_chars.write(content)
-            if not cur is None:
-                cur(stack_chars.getvalue())
+            stack_chars.append(content)
 
     def endElement(self, name):
-        cur, cur_name, cur_type, _ = self.stack.pop()
+        if self.skip_depth:
+            self.skip_depth -= 1
+            return
+
+        cur, cur_name, stack_chars, attr_name = self.stack.pop()
         if name != cur_name:
             raise RuntimeError("Invalid stack order")
+        if stack_chars:
+            cur(''.join(stack_chars))
 
-        attr_name = name.replace('-', '_')
-        top, _, _, _ = self.stack[-1]
-
-        if cur_type == 'element':
-            elements = getattr(top, attr_name, DataList())
-            elements.append(cur)
-            setattr(top, attr_name, elements)
-
-        elif cur_type == 'attribute':
-            setattr(top, attr_name, cur)
+        # Notify about closed top-level sections below <pfsense>
+        if len(self.stack) == 2 and not self.section_callback is None:
+            self.section_callback(attr_name)
 
     def endDocument(self):
         if self.stack[-1][0] != self.document:
             raise RuntimeError("Pending stack elements")
-
-def parse_pfsense(input_path, document):
-    handler = PfSenseContentHandler(document)
-    if input_path == '-':
+        if not self.created is None:
+            for klass, created in sorted(self.created.items(), key=lambda item: item[0].__name__):
+                count('nodes', created, **{'class': klass.__name__})
+
+def parse_sax(input_file, handler):
+    parse(input_file, handler)
+
+def parse_iterparse(input_file, handler):
+    handler.startDocument()
+    for event, element in iterparse(input_file, events=('start', 'end')):
+        if event == 'start':
+            handler.startElement(element.tag, element.attrib)
+        else:
+            chars = [element.text] + [child.tail for child in element]
+            content = ''.join(filter(None, chars))
+            if content:
+                handler.characters(content)
+            handler.endElement(element.tag)
+            # The tail belongs to the parent and is collected at its end event
+            tail = element.tail
+            element.clear()
+            element.tail = tail
+    handler.endDocument()
+
+PARSER_BACKENDS = {
+    'sax': parse_sax,
+    'iterparse': parse_iterparse,
+}
+
+def track_progress(parse_func, progress):
+    """Wraps a parser backend to report the bytes it consumes and the elements handled so far"""
+    def parse_tracked(input_file, handler):
+        progress.total = input_size(input_file)
+        parse_func(ProgressReader(input_file, progress, lambda: handler.elements), handler)
+    return parse_tracked
+
+def parse_pfsense(input_path, document, parser='sax', section_callback=None, progress=None):
+    parse_func = PARSER_BACKENDS[parser]
+    if not progress is None:
+        parse_func = track_progress(parse_func, progress)
+    handler = PfSenseContentHandler(document, section_callback)
+    if hasattr(input_path, 'read'):
+        parse_func(input_path, handler)
+    elif input_path == '-':
         with sys.stdin as input_file:
-            parse(input_file, handler)
+            parse_func(input_file, handler)
     else:
         with open(input_path, 'rb') as input_file:
-            parse(input_file, handler)
+            parse_func(input_file, handler)
+    return handler
+
+def parse_pfsense_cached(input_path, document, cache, parser='sax', section_callback=None, progress=None):
+    """Returns the cached document on a hit with a None handler, otherwise parses into document"""
+    if input_path == '-':
+        input_file = io.BytesIO(sys.stdin.buffer.read())
+    else:
+        input_file = open(input_path, 'rb')
+    with input_file:
+        key = cache.key(input_file)
+        cached_document = cache.load(key)
+        if not cached_document is None:
+            return cached_document, None
+        input_file.seek(0)
+        handler = parse_pfsense(input_file, document, parser, section_callback, progress)
+    cache.store(key, document)
+    return document, handler
+
+def print_skipped(handler):
+    skipped_elements = sum(stats[1] for stats in handler.skipped.values())
+    skipped_chars = sum(stats[2] for stats in handler.skipped.values())
+    print('Skipped {} of {} elements ({:.1%}) and {} of {} characters ({:.1%}) in unmodelled sections:'.format(
+        skipped_elements, handler.elements, skipped_elements / max(handler.elements, 1),
+        skipped_chars, handler.chars, skipped_chars / max(handler.chars, 1)))
+    skipped = sorted(handler.skipped.items(), key=lambda item: (-item[1][2], -item[1][1]))
+    for name, (subtrees, elements, chars) in skipped[:10]:
+        print('  {}: {} subtrees, {} elements, {} characters'.format(name, subtrees, elements, chars))
 
 def parse_args():
     parser = argparse.ArgumentParser()
     parser.add_argument("input_path", help="XML input path")
+    parser.add_argument("--parser", dest="parser", help="XML parser backend", default="sax", choices=PARSER_BACKENDS.keys())
+    parser.add_argument("--cache-dir", dest="cache_dir", help=CACHE_DIR_HELP)
+    parser.add_argument("--cache-size", dest="cache_size", help="Maximum cache size in MB", type=int, default=DEFAULT_CACHE_SIZE // 2**20)
     return parser.parse_args()
 
 def main():
+    # Not imported at the top, pf-format imports this module and never prints the tree
+    from pprint import pprint
+
     args = parse_args()
-    doc = PfSenseDocument()
-    parse_pfsense(args.input_path, doc)
+    if args.cache_dir:
+        doc, handler = parse_pfsense_cached(args.input_path, PfSenseDocument(), ParseCache(args.cache_dir, args.cache_size * 2**20), args.parser)
+    else:
+        doc = PfSenseDocument()
+        handler = parse_pfsense(args.input_path, doc, args.parser)
     pprint(doc)
+    if handler is None:
+        print('Loaded from cache, no statistics about skipped sections.')
+    else:
+        print_skipped(handler)
 
 if __name__ == '__main__':
     main()
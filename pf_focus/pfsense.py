@@ -1,23 +1,50 @@
 #!/usr/bin/env python3
+import itertools
 import re
 from datetime import datetime, timezone
-from pprint import pformat
 
-from pf_focus.util import DataNode, hasattr_r
+from pf_focus.addresses import AddressSet, PortSet, interface_addresses, parse_networks, parse_port_range, resolve_aliases
+from pf_focus.timings import count
+from pf_focus.util import DataList, DataNode, hasattr_r, obj_attributes
 
 
 class PfSenseNode(DataNode):
-    def __init__(self, parent=None):
+    __slots__ = ('_parent', '_document')
+    _schema = {}
+    _schema_wildcards = ()
+    _wildcards = ()
+    _cacheable = False
+    _data_cache = None
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        compile_schema(cls)
+        # Only nodes with a __dict__ can hold a cached data tree
+        cls._cacheable = cls.__dictoffset__ != 0
+
+    def __init__(self, parent=None, document=None):
         self._parent = parent
+        if document is None:
+            document = parent._document if parent else self
+        self._document = document
 
     def __getattr__(self, name):
         # This trick hides PyLint error messages...
         return super().__getattribute__(name)
 
+    def __setattr__(self, name, value):
+        super().__setattr__(name, value)
+        if not name.startswith('_'):
+            if isinstance(value, DataList):
+                value._owner = self
+            self.invalidate_data()
+
     def __call__(self, content):
         pass # discard content
 
     def __repr__(self):
+        # pprint is slow to import and only needed for debugging
+        from pprint import pformat
         return pformat(self.data)
 
     def __str__(self):
@@ -32,60 +59,133 @@ class PfSenseNode(DataNode):
 
     @property
     def rootdoc(self):
-        return list(self.parents)[-1]
+        return self._document
+
+    def get_data(self, cache=True):
+        if not cache or not self._cacheable:
+            return super().get_data(cache)
+        generation = self._document.generation
+        if not self._data_cache is None and self._data_cache[0] == generation:
+            return self._data_cache[1]
+        data = super().get_data(cache)
+        self._data_cache = (generation, data)
+        return data
+
+    def invalidate_data(self):
+        # A cached node implies cached descendants, so stop at the first uncached ancestor
+        if self._cacheable:
+            if self._data_cache is None:
+                return
+            self._data_cache = None
+        if self._parent:
+            self._parent.invalidate_data()
+
+    def __getstate__(self):
+        # Cached data trees are rebuilt on demand and not worth pickling
+        state = obj_attributes(self)
+        state.pop('_data_cache', None)
+        return state
+
+    def __setstate__(self, state):
+        # Bypass __setattr__, parents are not fully restored yet
+        for name, value in state.items():
+            object.__setattr__(self, name, value)
+
+    @classmethod
+    def lookup_schema(cls, name):
+        schema_entry = cls._schema.get(name)
+        if schema_entry is None:
+            for wildcard, (klass, klass_type, _) in cls._schema_wildcards:
+                if name.startswith(wildcard):
+                    return (klass, klass_type, name.replace('-', '_'))
+        return schema_entry
+
+def compile_schema(cls):
+    schema = {}
+    for klass_lookup in dir(cls):
+        if not klass_lookup.startswith('_') or klass_lookup.startswith('__'):
+            continue
+        klass = getattr(cls, klass_lookup)
+        if isinstance(klass, list):
+            klass, klass_type = klass[0], 'element'
+        elif isinstance(klass, type) and issubclass(klass, PfSenseNode):
+            klass_type = 'attribute'
+        else:
+            continue
+        attr_name = klass_lookup[1:]
+        # Tags may spell any underscore of the attribute name as a dash
+        parts = attr_name.split('_')
+        for seps in itertools.product('_-', repeat=len(parts)-1):
+            name = parts[0] + ''.join(sep + part for sep, part in zip(seps, parts[1:]))
+            schema[name] = (klass, klass_type, attr_name)
+    cls._schema = schema
+    cls._schema_wildcards = tuple((wildcard, schema[wildcard]) for wildcard in cls._wildcards if wildcard in schema)
 
 class PfSenseString(PfSenseNode):
-    string = None
+    __slots__ = ('string',)
+
+    def __init__(self, parent=None, document=None):
+        super().__init__(parent, document)
+        self.string = None
 
     def __call__(self, content):
         self.string = str(content)
 
-    @property
-    def data(self):
+    def get_data(self, cache=True):
         return self.string
 
 class PfSenseInteger(PfSenseNode):
-    integer = None
+    __slots__ = ('integer',)
+
+    def __init__(self, parent=None, document=None):
+        super().__init__(parent, document)
+        self.integer = None
 
     def __call__(self, content):
         self.integer = int(content)
 
-    @property
-    def data(self):
+    def get_data(self, cache=True):
         return self.integer
 
 class PfSenseTimestamp(PfSenseNode):
-    datetime = None
+    __slots__ = ('datetime',)
+
+    def __init__(self, parent=None, document=None):
+        super().__init__(parent, document)
+        self.datetime = None
 
     def __call__(self, content):
         self.datetime = datetime.fromtimestamp(int(content), timezone.utc)
 
-    @property
-    def data(self):
+    def get_data(self, cache=True):
         return self.datetime
 
 class PfSenseInterfacesNode(PfSenseNode):
-    def __getattr__(self, name):
-        if name.startswith('_opt'):
-            return self._opt
-        return super().__getattribute__(name)
+    _wildcards = ('opt',)
+
+class PfSenseIndexedNode(PfSenseNode):
+    def invalidate_data(self):
+        super().invalidate_data()
+        self.rootdoc.invalidate()
 
 class PfSenseFlag(PfSenseNode):
-    @property
-    def data(self):
+    __slots__ = ()
+
+    def get_data(self, cache=True):
         return True
 
 class PfSenseAliasString(PfSenseString):
-    @property
-    def data(self):
-        data = super().data
-        if hasattr_r(self.rootdoc.pfsense, 'aliases.alias'):
-            for alias in self.rootdoc.pfsense.aliases.alias:
-                if alias.name.string == data:
-                    return {'alias': alias.data}
+    __slots__ = ()
+
+    def get_data(self, cache=True):
+        data = super().get_data(cache)
+        alias_data = self.rootdoc.resolve_alias(data)
+        if not alias_data is None:
+            return alias_data
         return data
 
 class PfSensePortString(PfSenseAliasString):
+    __slots__ = ()
     PORT_STRING = re.compile(r'(\d+((:|-)(\d+))?|[a-zA-Z0-9_]+)')
 
     def __call__(self, content):
@@ -93,6 +193,10 @@ class PfSensePortString(PfSenseAliasString):
         if self.PORT_STRING.fullmatch(self.string) is None:
             raise RuntimeError("Invalid port string: {}".format(self.string))
 
+    @property
+    def ports(self):
+        return self.rootdoc.resolve_ports(self.string)
+
 class PfSenseChange(PfSenseNode):
     _time = PfSenseTimestamp
     _username = PfSenseString
@@ -127,38 +231,37 @@ class PfSenseDhcpd(PfSenseInterfacesNode):
     _opt = PfSenseDhcpdItem
 
 class PfSenseRuleAlias(PfSenseString):
-    @property
-    def data(self):
-        data = super().data
-        for interface_name, interface_data in self.rootdoc.pfsense.interfaces.data.items():
-            alias_name = data
-            if alias_name.endswith('ip'):
-                alias_name = alias_name[:-2]
-            if interface_name == alias_name:
-                interface_data['name'] = data
-                return {'interface': interface_data}
-        if hasattr_r(self.rootdoc.pfsense, 'aliases.alias'):
-            for alias in self.rootdoc.pfsense.aliases.alias:
-                if alias.name.string == data:
-                    return {'alias': alias.data}
+    __slots__ = ()
+
+    def get_data(self, cache=True):
+        data = super().get_data(cache)
+        if data is None:
+            return data
+        interface_data = self.rootdoc.resolve_interface(data, ip_suffix=True)
+        if not interface_data is None:
+            return interface_data
+        alias_data = self.rootdoc.resolve_alias(data)
+        if not alias_data is None:
+            return alias_data
         return data
 
-class PfSenseRuleInterface(PfSenseString):
     @property
-    def data(self):
-        data = super().data
+    def addresses(self):
+        return self.rootdoc.resolve_addresses(self.string)
+
+class PfSenseRuleInterface(PfSenseString):
+    __slots__ = ()
+
+    def get_data(self, cache=True):
+        data = super().get_data(cache)
         if data is None:
             return data
         data_list = []
         for iface_name in data.split(','):
-            found = False
-            for interface_name, interface_data in self.rootdoc.pfsense.interfaces.data.items():
-                if interface_name == iface_name:
-                    interface_data['name'] = iface_name
-                    data_list.append({'interface': interface_data})
-                    found = True
-                    break
-            if not found:
+            interface_data = self.rootdoc.resolve_interface(iface_name)
+            if not interface_data is None:
+                data_list.append(interface_data)
+            else:
                 data_list.append(iface_name)
         return data_list
 
@@ -169,6 +272,21 @@ class PfSenseRuleLocation(PfSenseNode):
     _port = PfSensePortString
     _not = PfSenseFlag
 
+    @property
+    def addresses(self):
+        """AddressSet of the address or network, None for any"""
+        for name in ('address', 'network'):
+            if hasattr_r(self, name + '.string') and not getattr(self, name).string is None and not hasattr(self, 'any'):
+                return getattr(self, name).addresses
+        return None
+
+    @property
+    def ports(self):
+        """PortSet of the port, None for any"""
+        if hasattr_r(self, 'port.string') and not self.port.string is None:
+            return self.port.ports
+        return None
+
 class PfSenseFilterRule(PfSenseNode):
     _id = PfSenseString
     _tracker = PfSenseString
@@ -185,6 +303,11 @@ class PfSenseFilterRule(PfSenseNode):
     _statetype = PfSenseString
     _os = PfSenseString
     _protocol = PfSenseString
+    _icmptype = PfSenseString
+    _sched = PfSenseString
+    _floating = PfSenseFlag
+    _quick = PfSenseFlag
+    _direction = PfSenseString
     _source = PfSenseRuleLocation
     _destination = PfSenseRuleLocation
     _descr = PfSenseString
@@ -232,14 +355,30 @@ class PfSenseNat(PfSenseNode):
     _outbound = PfSenseNatOutbound
     _rule = [PfSenseNatRule]
 
-class PfSenseAlias(PfSenseNode):
+class PfSenseAlias(PfSenseIndexedNode):
     _name = PfSenseString
     _type = PfSenseString
     _address = PfSenseString
     _descr = PfSenseString
     _detail = PfSenseString
 
-class PfSenseAliases(PfSenseNode):
+    @property
+    def members(self):
+        """AddressSet or PortSet of the alias with nested aliases expanded"""
+        if not hasattr_r(self, 'name.string'):
+            return None
+        return self.rootdoc.alias_members.get(self.name.string)
+
+    def get_data(self, cache=True):
+        data = super().get_data(cache)
+        members = self.members
+        if members is None:
+            return data
+        data = dict(data)
+        data['resolved'] = members.get_data(cache)
+        return data
+
+class PfSenseAliases(PfSenseIndexedNode):
     _alias = [PfSenseAlias]
 
 class PfSenseDnsMasqDomainOverride(PfSenseNode):
@@ -363,14 +502,14 @@ class PfSenseBridged(PfSenseNode):
 class PfSenseBridges(PfSenseNode):
     _bridged = [PfSenseBridged]
 
-class PfSenseInterface(PfSenseNode):
+class PfSenseInterface(PfSenseIndexedNode):
     _if = PfSenseString
     _descr = PfSenseString
     _ipaddr = PfSenseString
     _subnet = PfSenseString
     _enable = PfSenseFlag
 
-class PfSenseInterfaces(PfSenseInterfacesNode):
+class PfSenseInterfaces(PfSenseInterfacesNode, PfSenseIndexedNode):
     _wan = PfSenseInterface
     _lan = PfSenseInterface
     _opt = PfSenseInterface
@@ -395,7 +534,7 @@ class PfSenseSystem(PfSenseNode):
     _language = PfSenseString
     _dnsserver = [PfSenseString]
 
-class PfSenseConfig(PfSenseNode):
+class PfSenseConfig(PfSenseIndexedNode):
     _version = PfSenseString
     _system = PfSenseSystem
     _interfaces = PfSenseInterfaces
@@ -414,3 +553,124 @@ class PfSenseConfig(PfSenseNode):
 
 class PfSenseDocument(PfSenseNode):
     _pfsense = PfSenseConfig
+
+    def __init__(self, parent=None, document=None):
+        super().__init__(parent, document)
+        self.invalidate()
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        state.pop('_alias_index', None)
+        state.pop('_interface_index', None)
+        state.pop('_alias_members', None)
+        state.pop('_address_cache', None)
+        state.pop('_port_cache', None)
+        return state
+
+    def __setstate__(self, state):
+        super().__setstate__(state)
+        self.invalidate()
+
+    def invalidate(self):
+        self._alias_index = None
+        self._interface_index = None
+        self._alias_members = None
+        self._address_cache = {}
+        self._port_cache = {}
+        # Cached data trees embed resolved aliases and interfaces
+        self._generation = getattr(self, '_generation', 0) + 1
+
+    @property
+    def generation(self):
+        return self._generation
+
+    @property
+    def alias_index(self):
+        if self._alias_index is None:
+            alias_index = {}
+            if hasattr_r(self, 'pfsense.aliases.alias'):
+                for alias in self.pfsense.aliases.alias:
+                    if hasattr_r(alias, 'name.string'):
+                        alias_index.setdefault(alias.name.string, alias.data)
+            self._alias_index = alias_index
+        return self._alias_index
+
+    def resolve_alias(self, name):
+        count('lookups', kind='alias')
+        alias_data = self.alias_index.get(name)
+        if alias_data is None:
+            return None
+        alias_data = dict(alias_data)
+        # Members are listed once in the aliases section, not for every reference
+        alias_data.pop('resolved', None)
+        return {'alias': alias_data}
+
+    @property
+    def interface_index(self):
+        if self._interface_index is None:
+            interface_index = {}
+            if hasattr_r(self, 'pfsense.interfaces'):
+                interface_index.update(self.pfsense.interfaces.data)
+            self._interface_index = interface_index
+        return self._interface_index
+
+    def resolve_interface(self, name, ip_suffix=False):
+        count('lookups', kind='interface')
+        interface_name = name
+        if ip_suffix and interface_name.endswith('ip'):
+            interface_name = interface_name[:-2]
+        interface_data = self.interface_index.get(interface_name)
+        if interface_data is None:
+            return None
+        interface_data = dict(interface_data)
+        interface_data['name'] = name
+        return {'interface': interface_data}
+
+    @property
+    def alias_members(self):
+        if self._alias_members is None:
+            aliases = {}
+            if hasattr_r(self, 'pfsense.aliases.alias'):
+                for alias in self.pfsense.aliases.alias:
+                    if hasattr_r(alias, 'name.string') and not alias.name.string in aliases:
+                        alias_type = alias.type.string if hasattr_r(alias, 'type.string') else None
+                        address = alias.address.string if hasattr_r(alias, 'address.string') else None
+                        aliases[alias.name.string] = (alias_type, (address or '').split())
+            self._alias_members = resolve_aliases(aliases)
+        return self._alias_members
+
+    def resolve_addresses(self, name):
+        """AddressSet of an address, network, interface or alias, parsed once per document"""
+        addresses = self._address_cache.get(name)
+        if addresses is None:
+            count('lookups', kind='addresses')
+            networks = parse_networks(name)
+            interface_data = None if networks else self.resolve_interface(name, ip_suffix=True)
+            alias_members = self.alias_members.get(name)
+            if networks:
+                addresses = AddressSet(networks)
+            elif not interface_data is None:
+                interface_data = interface_data['interface']
+                addresses = interface_addresses(interface_data, address_only=not name in self.interface_index)
+            elif isinstance(alias_members, AddressSet):
+                addresses = alias_members
+            else:
+                addresses = AddressSet(names=(name,))
+            self._address_cache[name] = addresses
+        return addresses
+
+    def resolve_ports(self, name):
+        """PortSet of a port, port range or port alias, parsed once per document"""
+        ports = self._port_cache.get(name)
+        if ports is None:
+            count('lookups', kind='ports')
+            port_range = parse_port_range(name)
+            alias_members = self.alias_members.get(name)
+            if not port_range is None:
+                ports = PortSet((port_range,))
+            elif isinstance(alias_members, PortSet):
+                ports = alias_members
+            else:
+                ports = PortSet(names=(name,))
+            self._port_cache[name] = ports
+        return ports
@@ -1,35 +1,133 @@
 #!/usr/bin/env python3
-import itertools
+import io
+import os
+import stat
 import sys
-import threading
 import time
 
 
-class Animation(threading.Thread):
-    CHARS = ('\u2630', '\u2631', '\u2632', '\u2634')
+def input_size(input_file):
+    """Size of a regular or in-memory input file, None if it cannot be known in advance"""
+    if isinstance(input_file, io.BytesIO):
+        return len(input_file.getbuffer())
+    try:
+        file_stat = os.fstat(input_file.fileno())
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        return None
+    return file_stat.st_size if stat.S_ISREG(file_stat.st_mode) else None
 
-    def __init__(self, quiet=False):
-        super().__init__()
+def format_size(size):
+    return '{:.1f} MB'.format(size / 2**20)
+
+def format_duration(seconds):
+    minutes, seconds = divmod(int(seconds + 0.5), 60)
+    return '{}:{:02d}'.format(minutes, seconds)
+
+class Progress(object):
+    """Progress line driven by the work done, redrawn at most every INTERVAL seconds
+
+    Entering the context yields None if quiet, so that callers skip all bookkeeping.
+    """
+    INTERVAL = 0.1
+
+    def __init__(self, label, total=None, total_items=None, item_name='elements', quiet=False, stream=None):
+        self.label = label
+        self.total = total
+        self.total_items = total_items
+        self.item_name = item_name
         self.quiet = quiet
-        self.is_running = False
+        self.stream = stream
+        self.done = 0
+        self.items = None
+        self.start = None
+        self.next_update = 0
+        self.line_length = 0
 
     def __enter__(self):
-        if not self.quiet:
-            self.start()
+        if self.quiet:
+            return None
+        if self.stream is None:
+            self.stream = sys.stderr
+        self.start = time.monotonic()
+        self.next_update = self.start + self.INTERVAL
+        return self
 
     def __exit__(self, type, value, tb):
-        if not self.quiet:
-            self.is_running = False
-            self.join()
-
-    def run(self):
-        self.is_running = True
-        for char in itertools.cycle(self.CHARS):
-            if self.is_running:
-                sys.stderr.write('\r{} Working ...'.format(char))
-                sys.stderr.flush()
-                time.sleep(0.1)
-            else:
-                sys.stderr.write('\r')
-                break
-        self.is_running = False
+        if not self.quiet and self.line_length:
+            self.stream.write('\r{}\r'.format(' ' * self.line_length))
+            self.stream.flush()
+
+    def update(self, done, items=None):
+        self.done = done
+        self.items = items
+        now = time.monotonic()
+        if now >= self.next_update:
+            self.next_update = now + self.INTERVAL
+            self.render(now)
+
+    def status(self, now):
+        elapsed = max(now - self.start, 1e-9)
+        rate = self.done / elapsed
+        parts = []
+        if not self.total_items is None and not self.items is None:
+            parts.append('{} of {} {}'.format(self.items, self.total_items, self.item_name))
+            fraction = self.items / max(self.total_items, 1)
+        elif not self.items is None:
+            parts.append('{} {}'.format(self.items, self.item_name))
+            fraction = None
+        else:
+            fraction = None
+        if self.total:
+            parts.append('{} of {} ({:.0%})'.format(format_size(self.done), format_size(self.total), self.done / self.total))
+            fraction = self.done / self.total
+        else:
+            parts.append(format_size(self.done))
+        parts.append('{}/s'.format(format_size(rate)))
+        if fraction:
+            parts.append('ETA {}'.format(format_duration(elapsed * (1 - fraction) / fraction)))
+        return '{} {}'.format(self.label, ', '.join(parts))
+
+    def render(self, now):
+        line = self.status(now)
+        padding = ' ' * max(self.line_length - len(line), 0)
+        self.line_length = len(line)
+        self.stream.write('\r{}{}'.format(line, padding))
+        self.stream.flush()
+
+class ProgressReader(object):
+    """Counts the bytes parsers consume from a binary input file"""
+
+    def __init__(self, input_file, progress, count_items=None):
+        self.input_file = input_file
+        self.progress = progress
+        self.count_items = count_items
+        self.consumed = 0
+
+    def read(self, size=-1):
+        data = self.input_file.read(size)
+        self.consumed += len(data)
+        self.progress.update(self.consumed, None if self.count_items is None else self.count_items())
+        return data
+
+    def close(self):
+        # The SAX reader closes its source once done
+        self.input_file.close()
+
+class ProgressWriter(object):
+    """Counts the characters and writes of an output stream"""
+
+    def __init__(self, stream, progress):
+        self.stream = stream
+        self.progress = progress
+        self.written = 0
+        self.writes = 0
+
+    def write(self, text):
+        result = self.stream.write(text)
+        self.written += len(text)
+        self.writes += 1
+        self.progress.update(self.written, self.writes)
+        return result
+
+    def flush(self):
+        self.stream.flush()
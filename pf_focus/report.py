@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+import weakref
+from collections import namedtuple
+from contextlib import contextmanager
+
+from pf_focus.pfsense import PfSenseNode, PfSenseRuleAlias, PfSenseRuleInterface, PfSenseRuleLocation
+from pf_focus.tables import (ALIASES, BRIDGES, DHCPD, DHCPD_RANGES, DHCPD_STATIC_MAPS, DNSMASQ, DNSMASQ_DOMAIN_OVERRIDES, DNSMASQ_HOSTS,
+                             FILTER_RULES, GATEWAYS, INTERFACES, NAT_OUTBOUND_RULES, NAT_RULES, OPENVPN_CLIENTS, OPENVPN_CSCS,
+                             OPENVPN_SERVERS, STATIC_ROUTES, SYSCTL, SYSLOG, SYSTEM, VLANS)
+from pf_focus.timings import timed
+from pf_focus.util import hasattr_r
+
+
+# Blocks of a report section, renderers turn them into their markup.
+# Text and cell values are resolved already but not yet escaped for a format.
+Heading = namedtuple('Heading', ('level', 'text', 'value'))
+Text = namedtuple('Text', ('text',))
+TableBlock = namedtuple('TableBlock', ('header', 'rows'))
+BLANK = Text('')
+
+def format_rule_interface(rule_interface):
+    if isinstance(rule_interface, list):
+        rule_interface = ', '.join(map(format_rule_interface, rule_interface))
+    elif isinstance(rule_interface, dict):
+        if 'descr' in rule_interface['interface']:
+            rule_interface = '[{name}](#interfaces "{descr}")'.format(**rule_interface['interface'])
+        else:
+            rule_interface = rule_interface['interface']['name']
+    return str(rule_interface)
+
+def format_rule_alias(rule_alias):
+    if isinstance(rule_alias, dict):
+        if 'alias' in rule_alias:
+            if 'address' in rule_alias['alias']:
+                rule_alias = '[{name}](#aliases "{address}")'.format(**rule_alias['alias'])
+            else:
+                rule_alias = rule_alias['alias']['name']
+        elif 'interface' in rule_alias:
+            if 'descr' in rule_alias['interface']:
+                rule_alias = '[{name}](#interfaces "{descr}")'.format(**rule_alias['interface'])
+            else:
+                rule_alias = rule_alias['interface']['name']
+    return str(rule_alias)
+
+def format_rule_location(rule_location):
+    if isinstance(rule_location, PfSenseRuleAlias):
+        rule_location = format_rule_alias(rule_location.data)
+    return str(rule_location)
+
+def resolve_cell(cell):
+    """The text of a cell, resolving the node data exactly once"""
+    data = cell.data if isinstance(cell, PfSenseNode) else cell
+    if data is None:
+        cell = ''
+    elif data is True:
+        cell = 'x'
+    elif isinstance(cell, PfSenseRuleAlias):
+        cell = format_rule_alias(data)
+    elif isinstance(cell, PfSenseRuleInterface):
+        cell = format_rule_interface(data)
+    elif isinstance(cell, PfSenseRuleLocation):
+        if hasattr(cell, 'not'):
+            data = '**!** '
+        else:
+            data = ''
+        if hasattr(cell, 'any'):
+            data += 'any'
+        elif hasattr(cell, 'address'):
+            data += format_rule_location(cell.address)
+        elif hasattr(cell, 'network'):
+            data += format_rule_location(cell.network)
+        if hasattr(cell, 'port'):
+            data += ':'
+            data += str(cell.port)
+        cell = data
+    else:
+        cell = data
+    return str(cell).replace('\n', '  ')
+
+def table_block(header, rows):
+    return TableBlock(header, [[resolve_cell(cell) for cell in row] for row in rows])
+
+def options_block(options):
+    return table_block(('Option', 'Value'), options.items())
+
+def table_section(title, table):
+    def build_section(doc):
+        if not hasattr_r(doc.pfsense, table.path):
+            return []
+        return [Heading(2, title, None), table_block(table.header, table.rows(doc.pfsense)), BLANK]
+    return build_section
+
+def build_header(doc):
+    return [Heading(1, 'pfSense', None), Text('Version {}'.format(doc.pfsense.version)), BLANK]
+
+def build_system(doc):
+    info = SYSTEM.items(doc.pfsense.system)
+    info['dnsserver'] = ', '.join(map(resolve_cell, info['dnsserver']))
+    return [Heading(2, 'System', None), options_block(info), BLANK]
+
+def build_dhcpd(doc):
+    if not hasattr_r(doc.pfsense, 'dhcpd'):
+        return []
+    blocks = [Heading(2, 'DHCP ranges', None)]
+    for dhcpd_interface_name in sorted(doc.pfsense.dhcpd.data.keys()):
+        dhcpd_interface = PfSenseRuleInterface(document=doc)
+        dhcpd_interface.string = dhcpd_interface_name
+        blocks.append(Heading(3, 'DHCPd configuration for {}', resolve_cell(dhcpd_interface)))
+        dhcpd = getattr(doc.pfsense.dhcpd, dhcpd_interface_name)
+        blocks += [options_block(DHCPD.items(dhcpd)), BLANK]
+        if hasattr_r(dhcpd, DHCPD_RANGES.path):
+            blocks += [Heading(4, 'Ranges', None), table_block(DHCPD_RANGES.header, DHCPD_RANGES.rows(dhcpd)), BLANK]
+        if hasattr_r(dhcpd, DHCPD_STATIC_MAPS.path):
+            blocks += [Heading(4, 'Static mappings', None), table_block(DHCPD_STATIC_MAPS.header, DHCPD_STATIC_MAPS.rows(dhcpd)), BLANK]
+    blocks.append(BLANK)
+    return blocks
+
+def build_dnsmasq(doc):
+    if not hasattr_r(doc.pfsense, DNSMASQ.path):
+        return []
+    blocks = [Heading(2, 'DNSmasq configuration', None), options_block(DNSMASQ.items(doc.pfsense.dnsmasq)), BLANK]
+    if hasattr_r(doc.pfsense, DNSMASQ_HOSTS.path):
+        blocks += [Heading(3, 'Host overrides', None), table_block(DNSMASQ_HOSTS.header, DNSMASQ_HOSTS.rows(doc.pfsense)), BLANK]
+    if hasattr_r(doc.pfsense, DNSMASQ_DOMAIN_OVERRIDES.path):
+        blocks += [Heading(3, 'Domain overrides', None),
+                   table_block(DNSMASQ_DOMAIN_OVERRIDES.header, DNSMASQ_DOMAIN_OVERRIDES.rows(doc.pfsense)), BLANK]
+    return blocks
+
+def openvpn_section(title, table):
+    def build_section(doc):
+        if not hasattr_r(doc.pfsense, table.path):
+            return []
+        blocks = [Heading(2, title, None)]
+        for openvpn in table.elements(doc.pfsense):
+            openvpn = table.items(openvpn)
+            blocks += [Heading(3, '{}', resolve_cell(openvpn['description'])), options_block(openvpn), BLANK]
+        return blocks
+    return build_section
+
+def build_syslog(doc):
+    if not hasattr_r(doc.pfsense, SYSLOG.path):
+        return []
+    return [Heading(2, 'Syslog configuration', None), options_block(SYSLOG.items(doc.pfsense.syslog)), BLANK]
+
+# Sections as (name, top-level tag, tags they resolve references against, build function)
+REPORT_SECTIONS = (
+    ('header', 'version', (), build_header),
+    ('system', 'system', (), build_system),
+    ('interfaces', 'interfaces', (), table_section('Interfaces', INTERFACES)),
+    ('vlans', 'vlans', (), table_section('VLANs', VLANS)),
+    ('bridges', 'bridges', ('interfaces',), table_section('Bridges', BRIDGES)),
+    ('gateways', 'gateways', ('interfaces',), table_section('Gateways', GATEWAYS)),
+    ('staticroutes', 'staticroutes', (), table_section('Static routes', STATIC_ROUTES)),
+    ('dhcpd', 'dhcpd', ('interfaces',), build_dhcpd),
+    ('aliases', 'aliases', (), table_section('Aliases', ALIASES)),
+    ('nat_rules', 'nat', ('interfaces', 'aliases'), table_section('NAT rules', NAT_RULES)),
+    ('nat_outbound_rules', 'nat', ('interfaces', 'aliases'), table_section('Outbound NAT rules', NAT_OUTBOUND_RULES)),
+    ('filter_rules', 'filter', ('interfaces', 'aliases'), table_section('Filter rules', FILTER_RULES)),
+    ('dnsmasq', 'dnsmasq', ('interfaces',), build_dnsmasq),
+    ('openvpn_servers', 'openvpn', ('interfaces',), openvpn_section('OpenVPN servers', OPENVPN_SERVERS)),
+    ('openvpn_clients', 'openvpn', ('interfaces',), openvpn_section('OpenVPN clients', OPENVPN_CLIENTS)),
+    ('openvpn_cscs', 'openvpn', (), table_section('OpenVPN client specific overrides', OPENVPN_CSCS)),
+    ('syslog', 'syslog', ('interfaces',), build_syslog),
+    ('sysctl', 'sysctl', (), table_section('System tunables', SYSCTL)),
+)
+
+# Built sections per document while shared_sections() is active, built anew for every report otherwise
+SHARED_BLOCKS = None
+
+@contextmanager
+def shared_sections():
+    """Builds each section once for all reports rendered within, documents must not change meanwhile"""
+    global SHARED_BLOCKS
+    previous, SHARED_BLOCKS = SHARED_BLOCKS, weakref.WeakKeyDictionary()
+    try:
+        yield
+    finally:
+        SHARED_BLOCKS = previous
+
+def section_blocks(doc, section):
+    name, _, _, build_section = section
+    blocks = {} if SHARED_BLOCKS is None else SHARED_BLOCKS.setdefault(doc, {})
+    if not name in blocks:
+        with timed('build', section=name):
+            blocks[name] = build_section(doc)
+    return blocks[name]
+
+def render_blocks(blocks, render_heading, render_text, render_table):
+    """The markup of all blocks as one string, so that a section takes a single write"""
+    parts = []
+    for block in blocks:
+        if isinstance(block, Heading):
+            render_heading(parts, block)
+        elif isinstance(block, TableBlock):
+            render_table(parts, block)
+        else:
+            render_text(parts, block)
+    return ''.join(parts)
+
+class StreamingReport(object):
+    """Renders sections as soon as their tags, and those they depend on, are parsed"""
+
+    def __init__(self, doc, stream, render_section, output_format):
+        self.doc = doc
+        self.stream = stream
+        self.render_section = render_section
+        self.output_format = output_format
+        self.closed = set()
+        self.pending = list(REPORT_SECTIONS)
+
+    def section_closed(self, name):
+        self.closed.add(name)
+        if 'version' in self.closed:
+            self.output_ready(lambda tag, deps: tag in self.closed and self.closed.issuperset(deps))
+
+    def finish(self):
+        self.output_ready(lambda tag, deps: True)
+
+    def output_ready(self, is_ready):
+        pending = []
+        for section in self.pending:
+            name, tag, deps, _ = section
+            if is_ready(tag, deps):
+                with timed('section', format=self.output_format, section=name):
+                    self.stream.write(self.render_section(section_blocks(self.doc, section)))
+            else:
+                pending.append(section)
+        if len(pending) < len(self.pending):
+            self.stream.flush()
+        self.pending = pending
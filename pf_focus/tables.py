@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+from pf_focus.util import DataList, dict_to_list, getattr_r, obj_attributes, obj_to_dict, obj_to_list
+
+
+def option_columns(*attributes):
+    return tuple((attribute, attribute) for attribute in attributes)
+
+class Table(object):
+    """Columns as (header, attribute) pairs, one row per node found at path"""
+
+    def __init__(self, name, path, columns):
+        self.name = name
+        self.path = path
+        self.columns = columns
+        self.header = tuple(header for header, _ in columns)
+        self.attributes = tuple(attribute for _, attribute in columns)
+
+    def elements(self, obj):
+        elements = obj if self.path is None else getattr_r(obj, self.path)
+        if elements is None:
+            return ()
+        if not isinstance(elements, DataList):
+            return (elements,)
+        return elements
+
+    def items(self, element):
+        return obj_to_dict(element, self.attributes)
+
+    def rows(self, obj):
+        for element in self.elements(obj):
+            yield obj_to_list(element, self.attributes)
+
+class InterfacesTable(Table):
+    def rows(self, obj):
+        interfaces = sorted(obj.rootdoc.interface_index.items(), key=lambda interface: interface[0])
+        for interface_name, interface_data in interfaces:
+            yield [interface_name] + dict_to_list(interface_data, self.attributes[1:])
+
+class HostOverridesTable(Table):
+    def rows(self, obj):
+        for element in self.elements(obj):
+            host = obj_to_dict(element, self.attributes + ('aliases',))
+            yield dict_to_list(host, self.attributes)
+            # Host aliases share the IP of their host, build rows without modifying the document
+            for item in getattr(host['aliases'], 'item', []):
+                yield dict_to_list(dict(item.data, ip=host['ip'], descr=item.data.get('description', '')), self.attributes)
+
+class DhcpdTable(Table):
+    """A per-interface DHCP table for all interfaces, prefixed by the interface name"""
+
+    def __init__(self, table):
+        super().__init__(table.name, 'dhcpd', (('Interface', None),) + table.columns)
+        self.table = table
+
+    def rows(self, obj):
+        dhcpd = getattr_r(obj, self.path)
+        if dhcpd is None:
+            return
+        for dhcpd_interface_name in sorted(name for name in obj_attributes(dhcpd) if not name.startswith('_')):
+            for row in self.table.rows(getattr(dhcpd, dhcpd_interface_name)):
+                yield [dhcpd_interface_name] + row
+
+SYSTEM = Table('system', 'system', option_columns('hostname', 'domain', 'timeservers', 'timezone', 'language', 'dnsserver'))
+INTERFACES = InterfacesTable('interfaces', 'interfaces', (('Name', None), ('Enabled', 'enable'), ('Description', 'descr'), ('Interface', 'if'), ('Address', 'ipaddr'), ('Subnet', 'subnet')))
+VLANS = Table('vlans', 'vlans.vlan', (('Name', 'vlanif'), ('Tag', 'tag'), ('Interface', 'if'), ('Description', 'descr')))
+BRIDGES = Table('bridges', 'bridges.bridged', (('Name', 'bridgeif'), ('Members', 'members'), ('Description', 'descr')))
+GATEWAYS = Table('gateways', 'gateways.gateway_item', (('Default', 'defaultgw'), ('Name', 'name'), ('Interface', 'interface'), ('Gateway', 'gateway'),
+                                                       ('Weight', 'weight'), ('IP', 'ipprotocol'), ('Description', 'descr')))
+STATIC_ROUTES = Table('staticroutes', 'staticroutes.route', (('Network', 'network'), ('Gateway', 'gateway'), ('Description', 'descr')))
+# Relative to one interface below <dhcpd>
+DHCPD = Table('dhcpd', None, option_columns('enable', 'defaultleasetime', 'maxleasetime'))
+DHCPD_RANGES = Table('dhcpd_ranges', 'range', (('From', 'from'), ('To', 'to')))
+DHCPD_STATIC_MAPS = Table('dhcpd_staticmaps', 'staticmap', (('MAC', 'mac'), ('Address', 'ipaddr'), ('Hostname', 'hostname')))
+ALIASES = Table('aliases', 'aliases.alias', (('Name', 'name'), ('Type', 'type'), ('Address', 'address'), ('Description', 'descr'), ('Detail', 'detail')))
+NAT_RULES = Table('nat_rules', 'nat.rule', (('Disabled', 'disabled'), ('Interface', 'interface'), ('Source', 'source'), ('Destination', 'destination'),
+                                            ('Protocol', 'protocol'), ('Target', 'target'), ('Local port', 'local_port'), ('Description', 'descr')))
+NAT_OUTBOUND_RULES = Table('nat_outbound_rules', 'nat.outbound.rule', (('Disabled', 'disabled'), ('Interface', 'interface'), ('Source', 'source'),
+                                                                       ('Destination', 'destination'), ('Destination port', 'dstport'), ('Protocol', 'protocol'),
+                                                                       ('Target', 'target'), ('Description', 'descr')))
+FILTER_RULES = Table('filter_rules', 'filter.rule', (('Disabled', 'disabled'), ('Interface', 'interface'), ('Type', 'type'), ('IP', 'ipprotocol'),
+                                                     ('Protocol', 'protocol'), ('Source', 'source'), ('Destination', 'destination'), ('Description', 'descr')))
+DNSMASQ = Table('dnsmasq', 'dnsmasq', option_columns('enable', 'regdhcp', 'regdhcpstatic', 'strict_order', 'custom_options', 'interface'))
+DNSMASQ_HOSTS = HostOverridesTable('dnsmasq_hosts', 'dnsmasq.hosts', (('Host', 'host'), ('Domain', 'domain'), ('IP', 'ip'), ('Description', 'descr')))
+DNSMASQ_DOMAIN_OVERRIDES = Table('dnsmasq_domainoverrides', 'dnsmasq.domainoverrides', (('Domain', 'domain'), ('IP', 'ip'), ('Description', 'descr')))
+OPENVPN_SERVERS = Table('openvpn_servers', 'openvpn.openvpn_server', option_columns(
+    'vpnid', 'mode', 'authmode', 'protocol', 'dev_mode', 'interface', 'ipaddr', 'local_port', 'crypto', 'digest', 'tunnel_network',
+    'remote_network', 'local_network', 'dynamic_ip', 'pool_enable', 'topology', 'description', 'custom_options'))
+OPENVPN_CLIENTS = Table('openvpn_clients', 'openvpn.openvpn_client', option_columns(
+    'vpnid', 'auth_user', 'mode', 'protocol', 'dev_mode', 'interface', 'ipaddr', 'local_port', 'server_addr', 'server_port', 'crypto',
+    'digest', 'tunnel_network', 'remote_network', 'local_network', 'topology', 'description', 'custom_options'))
+OPENVPN_CSCS = Table('openvpn_cscs', 'openvpn.openvpn_csc', (('VPN IDs', 'server_list'), ('Common Name', 'common_name'), ('Description', 'description'),
+                                                             ('Tunnel Network', 'tunnel_network')))
+SYSLOG = Table('syslog', 'syslog', option_columns('enable', 'logall', 'logfilesize', 'nentries', 'remoteserver', 'remoteserver2', 'remoteserver3', 'sourceip', 'ipproto'))
+SYSCTL = Table('sysctl', 'sysctl.item', (('Name', 'tunable'), ('Value', 'value'), ('Description', 'descr')))
+
+# Every table with rows relative to <pfsense>
+TABLES = (
+    SYSTEM,
+    INTERFACES,
+    VLANS,
+    BRIDGES,
+    GATEWAYS,
+    STATIC_ROUTES,
+    DhcpdTable(DHCPD),
+    DhcpdTable(DHCPD_RANGES),
+    DhcpdTable(DHCPD_STATIC_MAPS),
+    ALIASES,
+    NAT_RULES,
+    NAT_OUTBOUND_RULES,
+    FILTER_RULES,
+    DNSMASQ,
+    DNSMASQ_HOSTS,
+    DNSMASQ_DOMAIN_OVERRIDES,
+    OPENVPN_SERVERS,
+    OPENVPN_CLIENTS,
+    OPENVPN_CSCS,
+    SYSLOG,
+    SYSCTL,
+)
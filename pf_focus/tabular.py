@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+import argparse
+import csv
+import itertools
+import os
+import sys
+from datetime import datetime
+
+from pf_focus.cache import CACHE_DIR_HELP, DEFAULT_CACHE_SIZE, ParseCache
+from pf_focus.parse import PARSER_BACKENDS, parse_pfsense, parse_pfsense_cached
+from pf_focus.pfsense import PfSenseDocument, PfSenseNode, PfSenseRuleLocation
+from pf_focus.tables import TABLES
+from pf_focus.util import getattr_r
+
+
+def format_csv_value(data):
+    if data is None:
+        return ''
+    elif data is True:
+        return 'true'
+    elif isinstance(data, datetime):
+        return data.isoformat()
+    elif isinstance(data, list):
+        return ', '.join(map(format_csv_value, data))
+    elif isinstance(data, dict):
+        # Resolved aliases and interfaces are referred to by name
+        for reference in ('alias', 'interface'):
+            if reference in data:
+                return data[reference].get('name', '')
+    return str(data)
+
+def format_csv_cell(cell):
+    if isinstance(cell, PfSenseRuleLocation):
+        location = '!' if hasattr(cell, 'not') else ''
+        if hasattr(cell, 'any'):
+            location += 'any'
+        elif hasattr(cell, 'address'):
+            location += format_csv_value(cell.address.data)
+        elif hasattr(cell, 'network'):
+            location += format_csv_value(cell.network.data)
+        if hasattr(cell, 'port'):
+            location += ':' + format_csv_value(cell.port.data)
+        return location
+    return format_csv_value(cell.data if isinstance(cell, PfSenseNode) else cell)
+
+def output_csv_table(stream, header, rows):
+    writer = csv.writer(stream)
+    writer.writerow(header)
+    for row in rows:
+        writer.writerow(map(format_csv_cell, row))
+
+def output_tables(doc, output_dir, tables=TABLES, firewall_column=False):
+    """Writes one CSV file per table with rows and returns their paths"""
+    firewall = getattr_r(doc, 'pfsense.system.hostname')
+    firewall = format_csv_cell(firewall)
+    output_paths = []
+    for table in tables:
+        header, rows = table.header, table.rows(doc.pfsense)
+        first_row = next(rows, None)
+        if first_row is None:
+            continue
+        rows = itertools.chain((first_row,), rows)
+        if firewall_column:
+            header = ('Firewall',) + header
+            rows = ([firewall] + row for row in rows)
+        output_path = os.path.join(output_dir, '{}.csv'.format(table.name))
+        with open(output_path, 'w', newline='') as output_file:
+            output_csv_table(output_file, header, rows)
+        output_paths.append(output_path)
+    return output_paths
+
+def parse_args():
+    table_names = [table.name for table in TABLES]
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-q", dest="quiet", action="store_const", const=True, default=False, help="Hide progress messages")
+    parser.add_argument("-i", dest="input_path", help="XML input path", required=True)
+    parser.add_argument("-O", dest="output_dir", help="Output directory for the CSV files", required=True)
+    parser.add_argument("-t", dest="tables", help="Table to export, repeatable (default: all)", action="append", choices=table_names)
+    parser.add_argument("--firewall-column", dest="firewall_column", action="store_const", const=True, default=False, help="Prepend the firewall hostname to every row")
+    parser.add_argument("--parser", dest="parser", help="XML parser backend", default="sax", choices=PARSER_BACKENDS.keys())
+    parser.add_argument("--cache-dir", dest="cache_dir", help=CACHE_DIR_HELP)
+    parser.add_argument("--cache-size", dest="cache_size", help="Maximum cache size in MB", type=int, default=DEFAULT_CACHE_SIZE // 2**20)
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    doc = PfSenseDocument()
+    if args.cache_dir:
+        doc, _ = parse_pfsense_cached(args.input_path, doc, ParseCache(args.cache_dir, args.cache_size * 2**20), args.parser)
+    else:
+        parse_pfsense(args.input_path, doc, args.parser)
+
+    tables = [table for table in TABLES if not args.tables or table.name in args.tables]
+    os.makedirs(args.output_dir, exist_ok=True)
+    output_paths = output_tables(doc, args.output_dir, tables, args.firewall_column)
+    if not args.quiet:
+        for output_path in output_paths:
+            print('\u2630 {}'.format(output_path), file=sys.stderr)
+        print('\u268d Successfully exported {} tables.'.format(len(output_paths)), file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+import json
+import os
+import time
+from contextlib import contextmanager
+
+
+# The collecting Timings, instrumentation points do nothing while it is None
+ACTIVE = None
+
+PROMETHEUS_PREFIX = 'pf_focus'
+
+def label_key(labels):
+    return tuple(sorted(labels.items()))
+
+class Timings(object):
+    """Wall time per stage and counters, collected while used as a context manager
+
+    Stages and counters are keyed by name and labels, repeated stages add up.
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self.counters = {}
+        self.previous = None
+
+    def __enter__(self):
+        global ACTIVE
+        self.previous, ACTIVE = ACTIVE, self
+        return self
+
+    def __exit__(self, type, value, tb):
+        global ACTIVE
+        ACTIVE, self.previous = self.previous, None
+
+    def add_time(self, name, seconds, **labels):
+        key = (name, label_key(labels))
+        self.stages[key] = self.stages.get(key, 0.0) + seconds
+
+    def count(self, name, amount=1, **labels):
+        key = (name, label_key(labels))
+        self.counters[key] = self.counters.get(key, 0) + amount
+
+    def get_data(self):
+        return {
+            'stages': [dict(name=name, labels=dict(labels), seconds=seconds) for (name, labels), seconds in self.stages.items()],
+            'counters': [dict(name=name, labels=dict(labels), value=value) for (name, labels), value in self.counters.items()],
+        }
+
+@contextmanager
+def timed(name, **labels):
+    timings = ACTIVE
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add_time(name, time.perf_counter() - start, **labels)
+
+def collecting():
+    return not ACTIVE is None
+
+def count(name, amount=1, **labels):
+    if not ACTIVE is None:
+        ACTIVE.count(name, amount, **labels)
+
+class CountingWriter(object):
+    """Counts the encoded bytes written to an output stream"""
+
+    def __init__(self, stream, **labels):
+        self.stream = stream
+        self.labels = labels
+
+    def write(self, text):
+        count('bytes_written', len(text.encode('utf-8')), **self.labels)
+        return self.stream.write(text)
+
+    def flush(self):
+        self.stream.flush()
+
+def format_name(name, labels):
+    return ' '.join([name] + ['{}={}'.format(label, value) for label, value in labels.items()])
+
+def output_timings_text(timings, stream):
+    data = timings.get_data()
+    for stage in data['stages']:
+        stream.write('{:10.3f} s  {}\n'.format(stage['seconds'], format_name(stage['name'], stage['labels'])))
+    for counter in data['counters']:
+        stream.write('{:12d}  {}\n'.format(counter['value'], format_name(counter['name'], counter['labels'])))
+
+def output_timings_json(timings, stream):
+    json.dump(timings.get_data(), stream, indent=2)
+    stream.write('\n')
+
+def prometheus_labels(labels):
+    if not labels:
+        return ''
+    escape = lambda value: str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return '{' + ','.join('{}="{}"'.format(name, escape(value)) for name, value in labels.items()) + '}'
+
+def output_timings_prometheus(timings, stream):
+    data = timings.get_data()
+    # The stage name becomes a label, so that all stages share one metric
+    metrics = {'{}_stage_seconds'.format(PROMETHEUS_PREFIX): [(dict(stage=stage['name'], **stage['labels']), stage['seconds'])
+                                                             for stage in data['stages']]}
+    for counter in data['counters']:
+        metrics.setdefault('{}_{}'.format(PROMETHEUS_PREFIX, counter['name']), []).append((counter['labels'], counter['value']))
+    for metric, samples in metrics.items():
+        if not samples:
+            continue
+        stream.write('# TYPE {} gauge\n'.format(metric))
+        for labels, value in samples:
+            stream.write('{}{} {}\n'.format(metric, prometheus_labels(labels), value))
+
+TIMINGS_FORMATS = {
+    'text': output_timings_text,
+    'json': output_timings_json,
+    'prometheus': output_timings_prometheus,
+}
+
+def write_timings(timings, output_path, output_format='text'):
+    """Writes timings to a path, replacing it at once so that collectors never read a partial textfile"""
+    temp_path = '{}.{}.tmp'.format(output_path, os.getpid())
+    try:
+        with open(temp_path, 'w') as output_file:
+            TIMINGS_FORMATS[output_format](timings, output_file)
+        os.replace(temp_path, output_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
@@ -2,26 +2,73 @@
 from collections import OrderedDict
 
 
+SLOT_NAMES = {}
+
+def slot_names(klass):
+    names = SLOT_NAMES.get(klass)
+    if names is None:
+        names = tuple(slot for base in reversed(klass.__mro__) for slot in base.__dict__.get('__slots__', ()))
+        SLOT_NAMES[klass] = names
+    return names
+
+def obj_attributes(obj):
+    attributes = {}
+    for slot in slot_names(type(obj)):
+        if hasattr(obj, slot):
+            attributes[slot] = getattr(obj, slot)
+    attributes.update(getattr(obj, '__dict__', ()))
+    return attributes
+
+
 class DataNode(object):
+    __slots__ = ()
+
     @property
     def data(self):
+        return self.get_data()
+
+    def get_data(self, cache=True):
         attr_filter = lambda x: not x[0].startswith('_')
-        data_items = filter(attr_filter, self.__dict__.items())
+        data_items = filter(attr_filter, obj_attributes(self).items())
         data = {}
         for key, value in data_items:
             if isinstance(value, DataNode):
-                data[key] = value.data
+                data[key] = value.get_data(cache)
             else:
                 data[key] = value
         return data
 
+def invalidating(method):
+    def mutate(self, *args, **kwargs):
+        result = method(self, *args, **kwargs)
+        if not self._owner is None:
+            self._owner.invalidate_data()
+        return result
+    return mutate
+
 class DataList(list, DataNode):
-    @property
-    def data(self):
+    """A list of nodes, changing it in place invalidates the cached data of the node holding it"""
+    # Set by PfSenseNode.__setattr__ when the list is assigned to a node
+    _owner = None
+
+    append = invalidating(list.append)
+    extend = invalidating(list.extend)
+    insert = invalidating(list.insert)
+    remove = invalidating(list.remove)
+    pop = invalidating(list.pop)
+    clear = invalidating(list.clear)
+    sort = invalidating(list.sort)
+    reverse = invalidating(list.reverse)
+    __setitem__ = invalidating(list.__setitem__)
+    __delitem__ = invalidating(list.__delitem__)
+    __iadd__ = invalidating(list.__iadd__)
+    __imul__ = invalidating(list.__imul__)
+
+    def get_data(self, cache=True):
         data = []
         for value in self:
             if isinstance(value, DataNode):
-                data.append(value.data)
+                data.append(value.get_data(cache))
             else:
                 data.append(value)
         return data
@@ -36,10 +83,10 @@ def dict_to_list(data, attributes):
     return list(data_values)
 
 def obj_to_dict(obj, attributes):
-    return dict_to_dict(obj.__dict__, attributes)
+    return dict_to_dict(obj_attributes(obj), attributes)
 
 def obj_to_list(obj, attributes):
-    return dict_to_list(obj.__dict__, attributes)
+    return dict_to_list(obj_attributes(obj), attributes)
 
 def hasattr_r(obj, attribute):
     for attr in attribute.split('.'):
@@ -47,3 +94,10 @@ def hasattr_r(obj, attribute):
             return False
         obj = getattr(obj, attr)
     return True
+
+def getattr_r(obj, attribute, default=None):
+    for attr in attribute.split('.'):
+        if not hasattr(obj, attr):
+            return default
+        obj = getattr(obj, attr)
+    return obj
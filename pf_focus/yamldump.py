@@ -0,0 +1,15 @@
+#!/usr/bin/env python3
+import yaml
+try:
+    from yaml import CSafeDumper as YamlDumper
+except ImportError:
+    from yaml import SafeDumper as YamlDumper
+
+from pf_focus.timings import timed
+
+
+def output_yaml(doc, stream, dumper=YamlDumper):
+    with timed('resolve'):
+        data = doc.data
+    # Both dumpers share SafeRepresenter, so timestamps and all other values are emitted identically
+    yaml.dump(data, stream, Dumper=dumper)
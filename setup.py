@@ -35,19 +35,40 @@ setup(
         'Topic :: Text Processing'],
     py_modules=[
         'pf_focus.util',
+        'pf_focus.addresses',
         'pf_focus.pfsense',
         'pf_focus.progress',
+        'pf_focus.timings',
+        'pf_focus.batch',
+        'pf_focus.cache',
         'pf_focus.parse',
+        'pf_focus.yamldump',
+        'pf_focus.formats',
         'pf_focus.format',
+        'pf_focus.report',
         'pf_focus.bbcode',
         'pf_focus.markdown',
+        'pf_focus.jsonl',
+        'pf_focus.tables',
+        'pf_focus.tabular',
+        'pf_focus.diff',
+        'pf_focus.correlate',
+        'pf_focus.analyze',
     ],
     entry_points = {
         'console_scripts': [
             'pf-parse=pf_focus.parse:main',
             'pf-format=pf_focus.format:main',
+            'pf-tables=pf_focus.tabular:main',
+            'pf-diff=pf_focus.diff:main',
+            'pf-correlate=pf_focus.correlate:main',
+            'pf-analyze=pf_focus.analyze:main',
             'pfFocus-parse=pf_focus.parse:main',
             'pfFocus-format=pf_focus.format:main',
+            'pfFocus-tables=pf_focus.tabular:main',
+            'pfFocus-diff=pf_focus.diff:main',
+            'pfFocus-correlate=pf_focus.correlate:main',
+            'pfFocus-analyze=pf_focus.analyze:main',
         ]
     },
     install_requires=read_file('requirements.txt').splitlines(),
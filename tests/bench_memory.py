@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+import argparse
+import gc
+import os
+import subprocess
+import sys
+import tempfile
+import tracemalloc
+
+from pf_focus.parse import parse_pfsense
+from pf_focus import pfsense
+
+
+RULE = '''		<rule>
+			<tracker>{0}</tracker>
+			<type>pass</type>
+			<interface>lan</interface>
+			<ipprotocol>inet</ipprotocol>
+			<protocol>tcp</protocol>
+			<source>
+				<address>10.0.{1}.0/24</address>
+			</source>
+			<destination>
+				<any/>
+				<port>{2}</port>
+			</destination>
+			<descr>Rule {0}</descr>
+			<created>
+				<time>{0}</time>
+				<username>admin@10.0.0.1</username>
+			</created>
+		</rule>
+'''
+
+def write_backup(output_path, rules):
+    with open(output_path, 'w') as output_file:
+        output_file.write('<?xml version="1.0"?>\n<pfsense>\n\t<version>15.4</version>\n\t<filter>\n')
+        for i in range(rules):
+            output_file.write(RULE.format(1500000000 + i, i % 256, 1024 + i % 1000))
+        output_file.write('\t</filter>\n</pfsense>\n')
+
+def use_dict_nodes():
+    # Emulate the previous layout: every slotted node class gets a per-instance __dict__
+    dict_klasses = {}
+    for klass in vars(pfsense).values():
+        if isinstance(klass, type) and issubclass(klass, pfsense.PfSenseNode) and '__slots__' in klass.__dict__:
+            dict_klasses[klass] = type(klass.__name__, (klass,), {})
+    for klass in vars(pfsense).values():
+        if isinstance(klass, type) and issubclass(klass, pfsense.PfSenseNode):
+            klass._schema = dict((name, (dict_klasses.get(child, child), child_type, attr_name))
+                                 for name, (child, child_type, attr_name) in klass._schema.items())
+            klass._schema_wildcards = tuple((wildcard, klass._schema[wildcard]) for wildcard, _ in klass._schema_wildcards)
+
+def bench_memory(input_path):
+    gc.collect()
+    tracemalloc.start()
+    doc = pfsense.PfSenseDocument()
+    parse_pfsense(input_path, doc)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    nodes = sum(1 for obj in gc.get_objects() if isinstance(obj, pfsense.PfSenseNode))
+    return current, peak, nodes
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-r", dest="rules", help="Number of filter rules", type=int, default=4000)
+    parser.add_argument("--input", dest="input_path", help="Measure a single run on this backup")
+    parser.add_argument("--dict-nodes", dest="dict_nodes", action="store_const", const=True, default=False, help="Use dict-based leaf nodes")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    if args.input_path:
+        if args.dict_nodes:
+            use_dict_nodes()
+        print(*bench_memory(args.input_path))
+        return
+
+    results = {}
+    with tempfile.TemporaryDirectory() as temp_dir:
+        input_path = os.path.join(temp_dir, 'backup.xml')
+        write_backup(input_path, args.rules)
+        for layout, extra_args in (('dict', ['--dict-nodes']), ('slots', [])):
+            output = subprocess.check_output([sys.executable, __file__, '--input', input_path] + extra_args)
+            results[layout] = list(map(int, output.split()))
+
+    print('{} rules, {} nodes'.format(args.rules, results['slots'][2]))
+    for layout, (current, peak, _) in results.items():
+        print('{:>6}: {:6.1f} MB retained, {:6.1f} MB peak while parsing'.format(layout, current / 2**20, peak / 2**20))
+    print('Saved: {:.0%} of retained memory'.format(1 - results['slots'][0] / results['dict'][0]))
+
+if __name__ == '__main__':
+    main()
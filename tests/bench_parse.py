@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+import argparse
+import os
+import tempfile
+import time
+
+from pf_focus.parse import parse_pfsense
+from pf_focus.pfsense import PfSenseDocument
+
+
+CHUNK = 'QUJDREVGR0hJSktMTU5PUFFSU1RVVldYWVo0MTIzNDU2Nzg5\n' * 1024
+
+def write_blob(output_file, name, size):
+    output_file.write('\t\t<{}>'.format(name))
+    while size > 0:
+        output_file.write(CHUNK[:size])
+        size -= len(CHUNK)
+    output_file.write('</{}>\n'.format(name))
+
+def write_backup(output_path, size):
+    with open(output_path, 'w') as output_file:
+        output_file.write('<?xml version="1.0"?>\n<pfsense>\n\t<version>15.4</version>\n')
+        output_file.write('\t<dnsmasq>\n')
+        write_blob(output_file, 'custom_options', size // 2)
+        output_file.write('\t</dnsmasq>\n\t<rrddata>\n\t\t<rrddatafile>\n')
+        write_blob(output_file, 'xmldata', size // 2)
+        output_file.write('\t\t</rrddatafile>\n\t</rrddata>\n</pfsense>\n')
+
+def bench_parse(input_path):
+    doc = PfSenseDocument()
+    start = time.perf_counter()
+    parse_pfsense(input_path, doc)
+    return time.perf_counter() - start
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-s", dest="sizes", help="Backup sizes in MB", type=int, nargs='+', default=[25, 50, 100])
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    results = []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for size in args.sizes:
+            input_path = os.path.join(temp_dir, 'backup-{}.xml'.format(size))
+            write_backup(input_path, size * 1024 * 1024)
+            seconds = bench_parse(input_path)
+            results.append((size, seconds))
+            print('{:>6} MB: {:8.3f} s, {:8.1f} MB/s'.format(size, seconds, size / seconds))
+            os.remove(input_path)
+    smallest, largest = results[0], results[-1]
+    print('Scaling: {:.1f}x size took {:.1f}x time'.format(largest[0] / smallest[0], largest[1] / smallest[1]))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_INPUT = os.path.join(TESTS_DIR, 'configs', 'pfSense-CE-2.3.4-RELEASE-amd64-config.xml')
+OPTIONAL_MODULES = ('yaml', 'pf_focus.markdown', 'pf_focus.bbcode', 'pf_focus.jsonl', 'pf_focus.batch', 'concurrent.futures.process')
+
+IMPORTED_MODULES = '''
+import sys
+import pf_focus.format
+print(' '.join(name for name in {!r} if name in sys.modules))
+'''
+
+def time_runs(command, runs):
+    """Median and best time, the best run is the least disturbed by other load"""
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(TESTS_DIR))
+    seconds = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(command, env=env, check=True, stdout=subprocess.DEVNULL)
+        seconds.append(time.perf_counter() - start)
+    return statistics.median(seconds), min(seconds)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Measure the cold start of pf-format")
+    parser.add_argument("-n", dest="runs", help="Runs per measurement", type=int, default=20)
+    parser.add_argument("-i", dest="input_path", help="Backup to format", default=DEFAULT_INPUT)
+    parser.add_argument("-f", dest="output_format", help="Output format", default="md")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(TESTS_DIR))
+    imported = subprocess.check_output([sys.executable, '-c', IMPORTED_MODULES.format(OPTIONAL_MODULES)], env=env).decode().split()
+    print('Imported by pf_focus.format: {}'.format(', '.join(imported) or 'none of {}'.format(', '.join(OPTIONAL_MODULES))))
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        output_path = os.path.join(temp_dir, 'output')
+        measurements = (
+            ('python startup', [sys.executable, '-c', 'pass']),
+            ('import pf_focus.format', [sys.executable, '-c', 'import pf_focus.format']),
+            ('pf-format -f {}'.format(args.output_format),
+             [sys.executable, '-m', 'pf_focus.format', '-q', '-i', args.input_path, '-f', args.output_format, '-o', output_path]),
+        )
+        for name, command in measurements:
+            median, best = time_runs(command, args.runs)
+            print('{:<28} median {:6.1f} ms, best {:6.1f} ms'.format(name, median * 1000, best * 1000))
+
+if __name__ == '__main__':
+    main()
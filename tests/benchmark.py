@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from generate_config import generate
+from pf_focus.formats import OUTPUT_FORMATS
+from pf_focus.parse import parse_pfsense
+from pf_focus.pfsense import PfSenseDocument
+
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+# Local history to compare runs against, ignored by git
+DEFAULT_RESULTS = os.path.join(TESTS_DIR, 'benchmark_results.jsonl')
+DEFAULT_SCALES = [1000, 5000, 10000, 50000]
+
+class NullWriter(object):
+    """Discards the output, so that rendering is measured without disk I/O"""
+
+    def write(self, text):
+        return len(text)
+
+    def flush(self):
+        pass
+
+def peak_rss():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes everywhere else
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+def bench_input(input_path, output_formats):
+    doc = PfSenseDocument()
+    start = time.perf_counter()
+    parse_pfsense(input_path, doc)
+    result = {'parse_seconds': time.perf_counter() - start, 'parse_peak_rss': peak_rss(), 'render_seconds': {}}
+    for output_format in output_formats:
+        # Every format starts from unresolved data, like a run with a single -f
+        doc.invalidate()
+        start = time.perf_counter()
+        OUTPUT_FORMATS[output_format](doc, NullWriter())
+        result['render_seconds'][output_format] = time.perf_counter() - start
+    result['peak_rss'] = peak_rss()
+    return result
+
+def bench_scale(temp_dir, rules, blob, output_formats):
+    input_path = os.path.join(temp_dir, 'backup-{}.xml'.format(rules))
+    with open(input_path, 'w') as output_file:
+        generate(output_file, rules=rules, aliases=max(20, rules // 20), staticmaps=max(10, rules // 100), blob=blob)
+    # A process per scale, so that the peak memory of one scale does not hide that of the next
+    output = subprocess.check_output([sys.executable, __file__, '--input', input_path, '-f'] + output_formats)
+    result = dict(rules=rules, size=os.path.getsize(input_path), **json.loads(output))
+    os.remove(input_path)
+    return result
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'describe', '--always', '--dirty'], cwd=TESTS_DIR, stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def load_previous(results_path):
+    """The last recorded run per number of rules"""
+    previous = {}
+    if not os.path.exists(results_path):
+        return previous
+    with open(results_path) as results_file:
+        for line in results_file:
+            record = json.loads(line)
+            for result in record['results']:
+                previous[result['rules']] = result
+    return previous
+
+def format_change(value, previous_value):
+    if not previous_value:
+        return ''
+    return ' ({:+.0%})'.format(value / previous_value - 1)
+
+def print_result(result, previous):
+    columns = [('parse', result['parse_seconds'], previous.get('parse_seconds'), '{:.3f} s')]
+    columns += [('peak', result['peak_rss'] / 2**20, previous.get('peak_rss', 0) / 2**20, '{:.0f} MB')]
+    for output_format, seconds in result['render_seconds'].items():
+        columns.append((output_format, seconds, previous.get('render_seconds', {}).get(output_format), '{:.3f} s'))
+    print('{:>6} rules, {:6.1f} MB: {}'.format(result['rules'], result['size'] / 2**20, ', '.join(
+        '{} {}{}'.format(name, value_format.format(value), format_change(value, previous_value))
+        for name, value, previous_value, value_format in columns)))
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Parse and render generated backups of increasing size")
+    parser.add_argument("-r", dest="scales", help="Numbers of filter rules", type=int, nargs='+', default=DEFAULT_SCALES)
+    parser.add_argument("-f", dest="output_formats", help="Output formats to render", nargs='+', choices=OUTPUT_FORMATS.keys(),
+                        default=list(OUTPUT_FORMATS.keys()))
+    parser.add_argument("--blob", dest="blob", help="Size of embedded blobs in bytes", type=int, default=2**20)
+    parser.add_argument("-o", dest="results_path", help="Results file, one JSON record per run", default=DEFAULT_RESULTS)
+    parser.add_argument("--no-record", dest="record", action="store_const", const=False, default=True, help="Only compare, do not record this run")
+    parser.add_argument("--input", dest="input_path", help="Measure a single run on this backup")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    if args.input_path:
+        print(json.dumps(bench_input(args.input_path, args.output_formats)))
+        return
+
+    previous = load_previous(args.results_path)
+    results = []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for rules in args.scales:
+            result = bench_scale(temp_dir, rules, args.blob, args.output_formats)
+            print_result(result, previous.get(rules, {}))
+            results.append(result)
+    if args.record:
+        record = {
+            'time': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'results': results,
+        }
+        with open(args.results_path, 'a') as results_file:
+            results_file.write(json.dumps(record) + '\n')
+        print('Recorded in {}'.format(args.results_path))
+
+if __name__ == '__main__':
+    main()
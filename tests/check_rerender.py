@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+import argparse
+import io
+import sys
+
+from pf_focus.bbcode import output_bbcode
+from pf_focus.markdown import output_markdown
+from pf_focus.parse import parse_pfsense
+from pf_focus.pfsense import PfSenseDocument
+
+
+CHANGED_DESCR = 'Changed after the first rendering'
+RENDERERS = (('md', output_markdown), ('bbcode', output_bbcode))
+
+def render(doc, output_func):
+    stream = io.StringIO()
+    output_func(doc, stream)
+    return stream.getvalue()
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Check that reports rendered again reflect a modified document")
+    parser.add_argument("input_paths", help="XML input paths", nargs='*')
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    failed = False
+    for input_path in args.input_paths:
+        doc = PfSenseDocument()
+        parse_pfsense(input_path, doc)
+        for _, output_func in RENDERERS:
+            render(doc, output_func)
+        doc.pfsense.filter.rule[0].descr(CHANGED_DESCR)
+        for output_format, output_func in RENDERERS:
+            if CHANGED_DESCR in render(doc, output_func):
+                print('{} ({}): changed rule rendered'.format(input_path, output_format))
+            else:
+                print('{} ({}): stale rule description rendered'.format(input_path, output_format))
+                failed = True
+    if failed:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+import argparse
+import io
+import sys
+from datetime import datetime, timezone
+
+import yaml
+
+from pf_focus.yamldump import output_yaml
+from pf_focus.parse import parse_pfsense
+from pf_focus.pfsense import PfSenseDocument, PfSenseTimestamp
+
+
+def dump_all(doc):
+    outputs = []
+    for dumper in (yaml.SafeDumper, yaml.CSafeDumper):
+        stream = io.StringIO()
+        output_yaml(doc, stream, dumper)
+        outputs.append(stream.getvalue())
+    return outputs
+
+def timestamp_document():
+    # Timestamps as produced by PfSenseTimestamp, the bundled config has none
+    doc = PfSenseDocument()
+    for i, timestamp in enumerate((0, 1500000000, 2147483647)):
+        node = PfSenseTimestamp(doc)
+        node(timestamp)
+        setattr(doc, 'time{}'.format(i), node)
+    doc.naive = datetime(2017, 7, 14, 2, 40, 0, 123456)
+    doc.utc = datetime(2017, 7, 14, 2, 40, 0, tzinfo=timezone.utc)
+    return doc
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("input_paths", help="XML input paths", nargs='*')
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    if not yaml.__with_libyaml__:
+        print('libyaml is not available, nothing to compare')
+        return
+
+    documents = [('timestamps', timestamp_document())]
+    for input_path in args.input_paths:
+        doc = PfSenseDocument()
+        parse_pfsense(input_path, doc)
+        documents.append((input_path, doc))
+
+    failed = False
+    for name, doc in documents:
+        python_output, c_output = dump_all(doc)
+        if python_output == c_output:
+            print('{}: identical ({} bytes)'.format(name, len(c_output)))
+        else:
+            print('{}: SafeDumper and CSafeDumper output differ'.format(name))
+            failed = True
+    if failed:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
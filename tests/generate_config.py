@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+import argparse
+import random
+import sys
+from xml.sax.saxutils import escape
+
+
+def element(stream, indent, name, value=None):
+    if value is None:
+        stream.write('{}<{}/>\n'.format('\t' * indent, name))
+    else:
+        stream.write('{}<{}>{}</{}>\n'.format('\t' * indent, name, escape(str(value)), name))
+
+def generate(stream, rules=100, nat_rules=None, aliases=20, interfaces=4, vlans=4, staticmaps=10, blob=0, seed=1):
+    """Writes a backup with the given number of elements, the same seed gives the same backup"""
+    rnd = random.Random(seed)
+    nat_rules = rules // 10 if nat_rules is None else nat_rules
+    ifnames = ['wan', 'lan'] + ['opt{}'.format(i) for i in range(1, interfaces - 1)]
+    w = stream.write
+    w('<?xml version="1.0"?>\n<pfsense>\n')
+    element(stream, 1, 'version', '15.4')
+    w('\t<lastchange/>\n\t<system>\n')
+    for name, value in (('optimization', 'normal'), ('hostname', 'fw{}'.format(seed)), ('domain', 'example.org'),
+                        ('timeservers', '0.pfsense.pool.ntp.org'), ('timezone', 'Etc/UTC'), ('language', 'en_US'),
+                        ('dnsserver', '8.8.8.8'), ('dnsserver', '8.8.4.4')):
+        element(stream, 2, name, value)
+    w('\t\t<user>\n\t\t\t<name>admin</name>\n\t\t\t<bcrypt-hash>$2b$10$xyz</bcrypt-hash>\n\t\t</user>\n')
+    w('\t</system>\n\t<interfaces>\n')
+    for i, name in enumerate(ifnames):
+        w('\t\t<{}>\n'.format(name))
+        element(stream, 3, 'enable')
+        element(stream, 3, 'if', 'em{}'.format(i))
+        if name != 'wan':
+            element(stream, 3, 'descr', name.upper() + ' net')
+        element(stream, 3, 'ipaddr', 'dhcp' if name == 'wan' else '10.{}.0.1'.format(i))
+        element(stream, 3, 'subnet', '' if name == 'wan' else '24')
+        element(stream, 3, 'spoofmac')
+        w('\t\t</{}>\n'.format(name))
+    w('\t</interfaces>\n')
+    w('\t<staticroutes>\n')
+    for i in range(3):
+        w('\t\t<route>\n')
+        element(stream, 3, 'network', '172.16.{}.0/24'.format(i))
+        element(stream, 3, 'gateway', 'GW_LAN')
+        element(stream, 3, 'descr', 'route | {}'.format(i))
+        w('\t\t</route>\n')
+    w('\t</staticroutes>\n\t<vlans>\n')
+    for i in range(vlans):
+        w('\t\t<vlan>\n')
+        element(stream, 3, 'if', 'em1')
+        element(stream, 3, 'tag', 100 + i)
+        element(stream, 3, 'descr', 'vlan {}'.format(i))
+        element(stream, 3, 'vlanif', 'em1.{}'.format(100 + i))
+        w('\t\t</vlan>\n')
+    w('\t</vlans>\n\t<bridges>\n\t\t<bridged>\n')
+    element(stream, 3, 'members', ','.join(ifnames[1:3]))
+    element(stream, 3, 'descr', 'bridge')
+    element(stream, 3, 'bridgeif', 'bridge0')
+    w('\t\t</bridged>\n\t</bridges>\n\t<gateways>\n')
+    for name in ifnames[:2]:
+        w('\t\t<gateway_item>\n')
+        element(stream, 3, 'interface', name)
+        element(stream, 3, 'gateway', 'dynamic')
+        element(stream, 3, 'name', 'GW_' + name.upper())
+        element(stream, 3, 'weight', 1)
+        element(stream, 3, 'ipprotocol', 'inet')
+        element(stream, 3, 'interval')
+        element(stream, 3, 'descr', 'gateway ' + name)
+        if name == 'wan':
+            element(stream, 3, 'defaultgw')
+        w('\t\t</gateway_item>\n')
+    w('\t</gateways>\n\t<dhcpd>\n')
+    for i, name in enumerate(ifnames[1:], 1):
+        w('\t\t<{}>\n'.format(name))
+        element(stream, 3, 'enable')
+        element(stream, 3, 'defaultleasetime', 7200)
+        w('\t\t\t<range>\n')
+        element(stream, 4, 'from', '10.{}.0.100'.format(i))
+        element(stream, 4, 'to', '10.{}.0.199'.format(i))
+        w('\t\t\t</range>\n')
+        for j in range(staticmaps):
+            w('\t\t\t<staticmap>\n')
+            element(stream, 4, 'mac', '00:11:22:33:{:02x}:{:02x}'.format(i, j % 256))
+            element(stream, 4, 'ipaddr', '10.{}.1.{}'.format(i, j % 250 + 1))
+            element(stream, 4, 'hostname', 'host{}-{}'.format(i, j))
+            w('\t\t\t</staticmap>\n')
+        w('\t\t</{}>\n'.format(name))
+    w('\t</dhcpd>\n\t<syslog>\n')
+    element(stream, 2, 'nentries', 50)
+    element(stream, 2, 'remoteserver', '10.1.0.5')
+    element(stream, 2, 'sourceip', 'lan')
+    element(stream, 2, 'enable')
+    w('\t</syslog>\n')
+    alias_names = []
+    w('\t<aliases>\n')
+    for i in range(aliases):
+        kind = ('host', 'network', 'port')[i % 3]
+        name = 'alias_{}_{}'.format(kind, i)
+        if kind == 'host':
+            address = ' '.join('10.{}.2.{}'.format(i % 200, k) for k in range(1, 4))
+            if alias_names:
+                address += ' ' + alias_names[0]
+        elif kind == 'network':
+            address = '10.{}.0.0/16 192.168.{}.0/24'.format(100 + i % 100, i % 250)
+        else:
+            address = '80 443 8000:8080'
+        w('\t\t<alias>\n')
+        element(stream, 3, 'name', name)
+        element(stream, 3, 'type', kind)
+        element(stream, 3, 'address', address)
+        element(stream, 3, 'descr', 'alias number {}'.format(i))
+        element(stream, 3, 'detail', '||'.join('entry' for _ in address.split()))
+        w('\t\t</alias>\n')
+        if kind != 'port':
+            alias_names.append(name)
+    w('\t</aliases>\n\t<nat>\n\t\t<outbound>\n')
+    element(stream, 3, 'mode', 'hybrid')
+    for i in range(max(1, nat_rules // 2)):
+        w('\t\t\t<rule>\n')
+        element(stream, 4, 'interface', 'wan')
+        w('\t\t\t\t<source>\n')
+        element(stream, 5, 'network', '10.{}.0.0/24'.format(i % 250))
+        w('\t\t\t\t</source>\n')
+        element(stream, 4, 'dstport', '53')
+        element(stream, 4, 'target')
+        element(stream, 4, 'descr', 'outbound {}'.format(i))
+        w('\t\t\t\t<destination>\n\t\t\t\t\t<any/>\n\t\t\t\t</destination>\n')
+        w('\t\t\t</rule>\n')
+    w('\t\t</outbound>\n')
+    for i in range(max(1, nat_rules)):
+        w('\t\t<rule>\n')
+        w('\t\t\t<source>\n\t\t\t\t<any/>\n\t\t\t</source>\n')
+        w('\t\t\t<destination>\n')
+        element(stream, 4, 'network', 'wanip')
+        element(stream, 4, 'port', 1000 + i)
+        w('\t\t\t</destination>\n')
+        element(stream, 3, 'protocol', 'tcp')
+        element(stream, 3, 'target', alias_names[i % len(alias_names)] if alias_names else '10.1.0.10')
+        element(stream, 3, 'local-port', 22)
+        element(stream, 3, 'interface', 'wan')
+        element(stream, 3, 'descr', 'nat {}'.format(i))
+        element(stream, 3, 'associated-rule-id', 'nat_{}'.format(i))
+        w('\t\t</rule>\n')
+    w('\t</nat>\n\t<filter>\n')
+    for i in range(rules):
+        w('\t\t<rule>\n')
+        element(stream, 3, 'id')
+        element(stream, 3, 'tracker', 1500000000 + i)
+        element(stream, 3, 'type', rnd.choice(('pass', 'pass', 'block', 'reject')))
+        element(stream, 3, 'interface', rnd.choice(ifnames))
+        element(stream, 3, 'ipprotocol', rnd.choice(('inet', 'inet', 'inet6')))
+        element(stream, 3, 'statetype', 'keep state')
+        protocol = rnd.choice(('tcp', 'udp', 'tcp/udp', 'icmp', None))
+        if protocol:
+            element(stream, 3, 'protocol', protocol)
+        for side in ('source', 'destination'):
+            w('\t\t\t<{}>\n'.format(side))
+            choice = rnd.random()
+            if choice < 0.2:
+                element(stream, 4, 'any')
+            elif choice < 0.5 and alias_names:
+                element(stream, 4, 'address', rnd.choice(alias_names))
+            elif choice < 0.7:
+                element(stream, 4, 'network', rnd.choice(ifnames) + rnd.choice(('', 'ip')))
+            else:
+                element(stream, 4, 'address', '10.{}.{}.0/24'.format(rnd.randrange(4), rnd.randrange(8)))
+            if side == 'destination' and protocol in ('tcp', 'udp', 'tcp/udp'):
+                element(stream, 4, 'port', rnd.choice(('22', '443', '3389', '1000-2000', '8000:9000')))
+            if rnd.random() < 0.05:
+                element(stream, 4, 'not')
+            w('\t\t\t</{}>\n'.format(side))
+        element(stream, 3, 'descr', 'rule <{}> | "quoted"'.format(i))
+        if rnd.random() < 0.1:
+            element(stream, 3, 'disabled')
+        w('\t\t\t<created>\n')
+        element(stream, 4, 'time', 1500000000 + i)
+        element(stream, 4, 'username', 'admin@10.0.0.1')
+        w('\t\t\t</created>\n')
+        w('\t\t</rule>\n')
+    w('\t</filter>\n\t<dnsmasq>\n')
+    element(stream, 2, 'enable')
+    element(stream, 2, 'custom_options', 'line1\nline2')
+    element(stream, 2, 'interface', 'lan,opt1')
+    for i in range(3):
+        w('\t\t<hosts>\n')
+        element(stream, 3, 'host', 'h{}'.format(i))
+        element(stream, 3, 'domain', 'example.org')
+        element(stream, 3, 'ip', '10.1.0.{}'.format(i + 10))
+        element(stream, 3, 'descr', 'host {}'.format(i))
+        w('\t\t\t<aliases>\n\t\t\t\t<item>\n')
+        element(stream, 5, 'host', 'alt{}'.format(i))
+        element(stream, 5, 'domain', 'example.net')
+        element(stream, 5, 'description', 'alt host {}'.format(i))
+        w('\t\t\t\t</item>\n\t\t\t</aliases>\n')
+        w('\t\t</hosts>\n')
+    w('\t\t<domainoverrides>\n')
+    element(stream, 3, 'domain', 'corp.local')
+    element(stream, 3, 'ip', '10.1.0.53')
+    element(stream, 3, 'idx', 0)
+    element(stream, 3, 'descr', 'corp')
+    w('\t\t</domainoverrides>\n\t</dnsmasq>\n\t<openvpn>\n\t\t<openvpn-server>\n')
+    for name, value in (('vpnid', 1), ('mode', 'server_tls'), ('authmode', 'Local Database'), ('protocol', 'UDP'),
+                        ('dev_mode', 'tun'), ('interface', 'wan'), ('local_port', 1194), ('crypto', 'AES-256-CBC'),
+                        ('digest', 'SHA256'), ('tunnel_network', '10.8.0.0/24'), ('local_network', '10.1.0.0/24'),
+                        ('topology', 'subnet'), ('description', 'Road warrior'), ('custom_options', 'push "route 10.2.0.0 255.255.255.0"')):
+        element(stream, 3, name, value)
+    w('\t\t</openvpn-server>\n\t\t<openvpn-client>\n')
+    for name, value in (('vpnid', 2), ('auth_user', 'user'), ('mode', 'p2p_tls'), ('protocol', 'UDP'), ('dev_mode', 'tun'),
+                        ('interface', 'wan'), ('server_addr', 'vpn.example.org'), ('server_port', 1194),
+                        ('description', 'Site link')):
+        element(stream, 3, name, value)
+    w('\t\t</openvpn-client>\n\t\t<openvpn-csc>\n')
+    for name, value in (('server_list', '1'), ('common_name', 'client1'), ('description', 'csc'), ('tunnel_network', '10.8.0.8/30')):
+        element(stream, 3, name, value)
+    w('\t\t</openvpn-csc>\n\t</openvpn>\n\t<sysctl>\n')
+    for i in range(5):
+        w('\t\t<item>\n')
+        element(stream, 3, 'tunable', 'net.inet.tcp.tunable{}'.format(i))
+        element(stream, 3, 'value', 'default')
+        element(stream, 3, 'descr', 'tunable {}'.format(i))
+        w('\t\t</item>\n')
+    w('\t</sysctl>\n')
+    w('\t<revision>\n')
+    element(stream, 2, 'time', 1500000000)
+    element(stream, 2, 'description', 'admin@10.0.0.1: saved')
+    w('\t</revision>\n')
+    w('\t<cert>\n')
+    element(stream, 2, 'refid', '5a000000')
+    element(stream, 2, 'crt', 'QUJD' * (blob // 8))
+    element(stream, 2, 'prv', 'REVG' * (blob // 8))
+    w('\t</cert>\n')
+    w('\t<rrddata>\n\t\t<rrddatafile>\n')
+    element(stream, 3, 'filename', 'wan-traffic.rrd')
+    element(stream, 3, 'xmldata', 'eJzt' * (blob // 4))
+    w('\t\t</rrddatafile>\n\t</rrddata>\n')
+    w('\t<installedpackages>\n\t\t<package>\n\t\t\t<name>pkg</name>\n\t\t</package>\n\t</installedpackages>\n')
+    w('</pfsense>\n')
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Generate a synthetic pfSense backup")
+    parser.add_argument("-o", dest="output_path", help="Output path", default="-")
+    parser.add_argument("-r", dest="rules", help="Number of filter rules", type=int, default=100)
+    parser.add_argument("-n", dest="nat_rules", help="Number of NAT rules (default: a tenth of the filter rules)", type=int, default=None)
+    parser.add_argument("-a", dest="aliases", help="Number of aliases", type=int, default=20)
+    parser.add_argument("--interfaces", dest="interfaces", help="Number of interfaces, at least wan and lan", type=int, default=4)
+    parser.add_argument("--vlans", dest="vlans", help="Number of VLANs", type=int, default=4)
+    parser.add_argument("--staticmaps", dest="staticmaps", help="Number of DHCP static mappings per interface", type=int, default=10)
+    parser.add_argument("--blob", dest="blob", help="Size of embedded certificate and RRD blobs in bytes", type=int, default=1000)
+    parser.add_argument("--seed", dest="seed", help="Random seed", type=int, default=1)
+    args = parser.parse_args()
+    if args.interfaces < 2:
+        parser.error("at least 2 interfaces are needed")
+    return args
+
+def main():
+    args = parse_args()
+    counts = dict(rules=args.rules, nat_rules=args.nat_rules, aliases=args.aliases, interfaces=args.interfaces,
+                  vlans=args.vlans, staticmaps=args.staticmaps, blob=args.blob, seed=args.seed)
+    if args.output_path == '-':
+        generate(sys.stdout, **counts)
+    else:
+        with open(args.output_path, 'w') as output_file:
+            generate(output_file, **counts)
+
+if __name__ == '__main__':
+    main()